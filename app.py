@@ -192,6 +192,57 @@ def extract_paper(paper_id):
     except Exception as e:
         return jsonify({'error': f'启动抽取任务失败: {str(e)}'}), 500
 
+@app.route('/api/extract_papers', methods=['POST'])
+def extract_papers():
+    """批量抽取多篇论文，未指定paper_ids时抽取所有尚未完成抽取的论文"""
+    try:
+        data = request.get_json(silent=True) or {}
+        paper_ids = data.get('paper_ids')
+        if paper_ids is None:
+            paper_ids = [p['id'] for p in paper_manager.get_collected_papers()
+                         if graphrag_manager.get_extraction_progress(p['id']).get('status') != 'completed']
+
+        papers = {}
+        for paper_id in paper_ids:
+            paper_data = paper_manager.get_paper_data(paper_id)
+            if not paper_data:
+                return jsonify({'error': f'论文不存在: {paper_id}'}), 404
+            papers[paper_id] = paper_data
+
+        if not papers:
+            return jsonify({'error': '没有需要抽取的论文'}), 400
+
+        # 检查配置
+        config = config_manager.get_config()
+        openai_config = config.get('openai', {})
+        if not openai_config.get('api_key'):
+            return jsonify({'error': '请先配置OpenAI API Key'}), 400
+
+        # 创建异步任务
+        task_id = str(uuid.uuid4())
+
+        async def batch_extraction_task():
+            try:
+                results = await graphrag_manager.extract_papers(papers)
+                failed = [pid for pid, success in results.items() if not success]
+                if failed:
+                    task_status[task_id] = {'status': 'failed', 'message': f'{len(failed)}/{len(results)} 篇论文抽取失败', 'failed': failed}
+                else:
+                    task_status[task_id] = {'status': 'completed', 'message': f'{len(results)} 篇论文抽取完成'}
+            except Exception as e:
+                task_status[task_id] = {'status': 'failed', 'message': f'抽取失败: {str(e)}'}
+
+        # 初始化任务状态
+        task_status[task_id] = {'status': 'started', 'message': f'开始批量抽取 {len(papers)} 篇论文...'}
+
+        # 在后台运行抽取任务
+        run_async(batch_extraction_task())
+
+        return jsonify({'task_id': task_id, 'paper_ids': list(papers), 'message': '批量抽取任务已启动'})
+
+    except Exception as e:
+        return jsonify({'error': f'启动批量抽取任务失败: {str(e)}'}), 500
+
 @app.route('/api/extraction_progress/<paper_id>')
 def get_extraction_progress(paper_id):
     """获取论文抽取进度"""
@@ -0,0 +1,102 @@
+"""Compare the precompiled extraction parser with the per-record regex parsing.
+
+Usage: python benchmarks/bench_extraction_parser.py [kv_store_llm_response_cache.json] [repeat]
+
+Without a cache file, synthetic outputs in the extraction prompt's format are
+used. Cached responses without tuple-delimited records are skipped.
+"""
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "core"))
+
+from nano_graphrag._op import (
+    ExtractionOutputParser,
+    _handle_single_entity_extraction,
+    _handle_single_relationship_extraction,
+)
+from nano_graphrag._utils import load_json, split_string_by_multi_markers
+from nano_graphrag.prompt import PROMPTS
+
+TUPLE = PROMPTS["DEFAULT_TUPLE_DELIMITER"]
+RECORD = PROMPTS["DEFAULT_RECORD_DELIMITER"]
+COMPLETION = PROMPTS["DEFAULT_COMPLETION_DELIMITER"]
+
+
+def parse_baseline(result: str, chunk_key: str):
+    """Parsing as done before ExtractionOutputParser"""
+    maybe_nodes = defaultdict(list)
+    maybe_edges = defaultdict(list)
+    for record in split_string_by_multi_markers(result, [RECORD, COMPLETION]):
+        record = re.search(r"\((.*)\)", record)
+        if record is None:
+            continue
+        record_attributes = split_string_by_multi_markers(record.group(1), [TUPLE])
+        if_entities = _handle_single_entity_extraction(record_attributes, chunk_key)
+        if if_entities is not None:
+            maybe_nodes[if_entities["entity_name"]].append(if_entities)
+            continue
+        if_relation = _handle_single_relationship_extraction(record_attributes, chunk_key)
+        if if_relation is not None:
+            maybe_edges[(if_relation["src_id"], if_relation["tgt_id"])].append(if_relation)
+    return dict(maybe_nodes), dict(maybe_edges)
+
+
+def synthetic_outputs(num_outputs: int = 500, records: int = 30) -> list[str]:
+    outputs = []
+    for i in range(num_outputs):
+        lines = []
+        for j in range(records):
+            if j % 3 == 2:
+                lines.append(
+                    f'("relationship"{TUPLE}"ENTITY {i}-{j - 2}"{TUPLE}"Entity {i}-{j - 1}"'
+                    f'{TUPLE}"The first &amp; the second are used together in paper {i}."'
+                    f"{TUPLE}{j % 10}.0)"
+                )
+            else:
+                lines.append(
+                    f'("entity"{TUPLE}"Entity {i}-{j}"{TUPLE}"METHOD"'
+                    f'{TUPLE}"Entity {i}-{j} is a method (variant {j}) proposed in paper {i}.")'
+                )
+        outputs.append(f"\n{RECORD}\n".join(lines) + f"\n{COMPLETION}")
+    return outputs
+
+
+def cached_outputs(file_name: str) -> list[str]:
+    cache = load_json(file_name) or {}
+    return [
+        v["return"]
+        for v in cache.values()
+        if isinstance(v, dict) and isinstance(v.get("return"), str) and TUPLE in v["return"]
+    ]
+
+
+def main():
+    outputs = cached_outputs(sys.argv[1]) if len(sys.argv) > 1 else synthetic_outputs()
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    if not outputs:
+        print("No extraction outputs found")
+        return
+    parser = ExtractionOutputParser(TUPLE, RECORD, COMPLETION)
+
+    num_records = 0
+    for i, output in enumerate(outputs):
+        parsed = parser.parse(output, f"chunk-{i}")
+        assert parsed == parse_baseline(output, f"chunk-{i}"), f"output {i} differs"
+        num_records += sum(map(len, parsed[0].values())) + sum(map(len, parsed[1].values()))
+    print(f"{len(outputs)} outputs, {num_records} records, identical results")
+
+    for name, parse in [("baseline", parse_baseline), ("precompiled", parser.parse)]:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for i, output in enumerate(outputs):
+                parse(output, f"chunk-{i}")
+        elapsed = time.perf_counter() - start
+        print(f"{name:>12}: {num_records * repeat / elapsed:,.0f} records/s")
+
+
+if __name__ == "__main__":
+    main()
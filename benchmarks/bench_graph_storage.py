@@ -0,0 +1,77 @@
+"""Compare GraphML and binary snapshot persistence of NetworkXStorage graphs.
+
+Usage: python benchmarks/bench_graph_storage.py [num_nodes]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "core"))
+
+import networkx as nx
+
+from nano_graphrag._storage.gdb_networkx import NetworkXStorage
+from nano_graphrag.prompt import GRAPH_FIELD_SEP
+
+
+def build_graph(num_nodes: int, avg_degree: int = 4, seed: int = 0) -> nx.Graph:
+    rng = random.Random(seed)
+    graph = nx.Graph()
+    for i in range(num_nodes):
+        graph.add_node(
+            f'"ENTITY {i}"',
+            entity_type='"CONCEPT"',
+            description=f"Entity {i} is described in several papers. " * 3,
+            source_id=GRAPH_FIELD_SEP.join(f"chunk-{rng.randrange(10**6)}" for _ in range(3)),
+        )
+    for _ in range(num_nodes * avg_degree // 2):
+        u, v = rng.randrange(num_nodes), rng.randrange(num_nodes)
+        graph.add_edge(
+            f'"ENTITY {u}"',
+            f'"ENTITY {v}"',
+            weight=float(rng.randint(1, 10)),
+            description=f"Entity {u} relates to entity {v}.",
+            source_id=f"chunk-{rng.randrange(10**6)}",
+            order=1,
+        )
+    return graph
+
+
+def timeit(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    num_nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    graph = build_graph(num_nodes)
+    print(f"Graph: {graph.number_of_nodes()} nodes, {graph.number_of_edges()} edges")
+    with tempfile.TemporaryDirectory() as working_dir:
+        for name, write, load, file_name in [
+            (
+                "graphml",
+                NetworkXStorage.write_nx_graph,
+                NetworkXStorage.load_nx_graph,
+                os.path.join(working_dir, "graph.graphml"),
+            ),
+            (
+                "binary",
+                NetworkXStorage.write_nx_graph_binary,
+                NetworkXStorage.load_nx_graph_binary,
+                os.path.join(working_dir, "graph.bin"),
+            ),
+        ]:
+            _, save_time = timeit(write, graph, file_name)
+            loaded, load_time = timeit(load, file_name)
+            assert loaded.number_of_edges() == graph.number_of_edges()
+            size_mb = os.path.getsize(file_name) / 2**20
+            print(
+                f"{name:>8}: save {save_time:.2f}s, load {load_time:.2f}s, size {size_mb:.1f}MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Compare the trie-based SeparatorSplitter with the per-position separator scan.
+
+Usage: python benchmarks/bench_separator_splitter.py [num_papers]
+
+Both are timed on synthetic full-text papers after checking they split them
+identically, tests/test_separator_splitter.py checks random token sequences.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "core"))
+
+from nano_graphrag._splitter import SeparatorSplitter
+from nano_graphrag._utils import get_tokenizer
+from nano_graphrag.prompt import PROMPTS
+
+
+def split_baseline(splitter: SeparatorSplitter, tokens: list[int]) -> list[list[int]]:
+    """Separator splitting as done before the trie"""
+    splits = []
+    current_split = []
+    i = 0
+    while i < len(tokens):
+        separator_found = False
+        for separator in splitter._separators:
+            if tokens[i : i + len(separator)] == separator:
+                if splitter._keep_separator in [True, "end"]:
+                    current_split.extend(separator)
+                if current_split:
+                    splits.append(current_split)
+                    current_split = []
+                if splitter._keep_separator == "start":
+                    current_split.extend(separator)
+                i += len(separator)
+                separator_found = True
+                break
+        if not separator_found:
+            current_split.append(tokens[i])
+            i += 1
+    if current_split:
+        splits.append(current_split)
+    return [s for s in splits if s]
+
+
+def make_paper(rng: random.Random, num_sections: int = 8) -> str:
+    words = (
+        "graph neural network model attention transformer protein dataset "
+        "training loss gradient embedding retrieval benchmark accuracy baseline "
+        "we propose method results show that significantly improves over prior work"
+    ).split()
+
+    def sentence() -> str:
+        text = " ".join(rng.choice(words) for _ in range(rng.randint(8, 30)))
+        return text.capitalize() + rng.choice([".", ".", ".", "?", "!"])
+
+    parts = ["Title of a paper\n\nAbstract\n" + " ".join(sentence() for _ in range(6))]
+    for s in range(num_sections):
+        parts.append(f"{s + 1} Section heading")
+        for _ in range(rng.randint(3, 6)):
+            parts.append(" ".join(sentence() for _ in range(rng.randint(3, 8))))
+            if rng.random() < 0.3:
+                parts.append("\tL(θ) = −∑ log p(y | x; θ)    (1)")
+    parts.append("References")
+    parts.extend(f"[{i}] A. Author. A cited work. Venue, 2020." for i in range(40))
+    return "\n\n".join(parts)
+
+
+def main():
+    num_papers = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    tokenizer = get_tokenizer()
+    separators = [tokenizer.encode(s) for s in PROMPTS["default_text_separator"]]
+    splitter = SeparatorSplitter(separators=separators, chunk_size=1200, chunk_overlap=100)
+    rng = random.Random(0)
+    papers = tokenizer.encode_batch([make_paper(rng) for _ in range(num_papers)])
+    num_tokens = sum(len(p) for p in papers)
+    for tokens in papers:
+        expected = split_baseline(splitter, tokens)
+        assert splitter._split_tokens_with_separators(tokens) == expected
+    print(f"{num_papers} papers, {num_tokens} tokens, identical splits")
+
+    for name, split in [
+        ("baseline", lambda tokens: split_baseline(splitter, tokens)),
+        ("trie", splitter._split_tokens_with_separators),
+    ]:
+        start = time.perf_counter()
+        for tokens in papers:
+            split(tokens)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>10}: {num_tokens / elapsed:,.0f} tokens/s")
+
+
+if __name__ == "__main__":
+    main()
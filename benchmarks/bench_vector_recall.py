@@ -0,0 +1,76 @@
+"""Measure HNSWVectorStorage recall@k against the exact NumpyVectorStorage.
+
+Usage: python benchmarks/bench_vector_recall.py [num_vectors] [dim] [top_k]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "core"))
+
+import numpy as np
+
+from nano_graphrag._storage import HNSWVectorStorage, NumpyVectorStorage
+from nano_graphrag._utils import EmbeddingFunc
+
+
+def make_embedding_func(vectors: dict[str, np.ndarray], dim: int) -> EmbeddingFunc:
+    async def lookup(texts: list[str]) -> np.ndarray:
+        return np.stack([vectors[t] for t in texts])
+
+    return EmbeddingFunc(embedding_dim=dim, max_token_size=8192, func=lookup)
+
+
+async def main():
+    num_vectors = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+    top_k = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    num_queries = 200
+
+    rng = np.random.default_rng(0)
+    # clustered data is closer to real embeddings than uniform noise
+    centers = rng.normal(size=(64, dim))
+    data = centers[rng.integers(0, 64, num_vectors)] + 0.5 * rng.normal(
+        size=(num_vectors, dim)
+    )
+    queries = centers[rng.integers(0, 64, num_queries)] + 0.5 * rng.normal(
+        size=(num_queries, dim)
+    )
+    vectors = {f"doc-{i}": v for i, v in enumerate(data)}
+    vectors.update({f"query-{i}": v for i, v in enumerate(queries)})
+    embedding_func = make_embedding_func(vectors, dim)
+    query_texts = [f"query-{i}" for i in range(num_queries)]
+
+    with tempfile.TemporaryDirectory() as working_dir:
+        global_config = {"working_dir": working_dir, "embedding_batch_num": 1024}
+        results = {}
+        for cls in [NumpyVectorStorage, HNSWVectorStorage]:
+            storage = cls(
+                namespace=cls.__name__,
+                global_config=global_config,
+                embedding_func=embedding_func,
+            )
+            start = time.perf_counter()
+            await storage.upsert({f"doc-{i}": {"content": f"doc-{i}"} for i in range(num_vectors)})
+            insert_time = time.perf_counter() - start
+            start = time.perf_counter()
+            results[cls.__name__] = await storage.query_batch(query_texts, top_k=top_k)
+            query_time = time.perf_counter() - start
+            print(
+                f"{cls.__name__:>20}: insert {insert_time:.2f}s, "
+                f"{num_queries} queries {query_time * 1000:.1f}ms"
+            )
+
+    recalls = [
+        len({r["id"] for r in approx} & {r["id"] for r in exact}) / len(exact)
+        for approx, exact in zip(
+            results["HNSWVectorStorage"], results["NumpyVectorStorage"]
+        )
+    ]
+    print(f"HNSW recall@{top_k}: {np.mean(recalls):.4f} (min {np.min(recalls):.2f})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
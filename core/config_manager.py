@@ -13,7 +13,9 @@ class ConfigManager:
                 'api_key': '',
                 'extract_model': 'gpt-4o-mini',
                 'qa_model': 'gpt-4o',
-                'temperature': 0.1
+                'temperature': 0.1,
+                # 按模型的限流预算，如 {"gpt-4o-mini": {"rpm": 500, "tpm": 200000}}
+                'rate_limits': {}
             },
             'system': {
                 'deep_mode': False,
@@ -8,6 +8,9 @@ from dataclasses import dataclass
 
 # 导入nano-graphrag核心模块
 from .nano_graphrag import GraphRAG, QueryParam
+from .nano_graphrag._op import chunking_by_paper_structure
+from .nano_graphrag._utils import compute_mdhash_id
+from .nano_graphrag._storage import JsonlKVStorage
 
 
 @dataclass
@@ -125,6 +128,13 @@ class GraphRAGManager:
             self.graphrag = GraphRAG(
                 working_dir=working_dir,
                 enable_llm_cache=True,
+                # 追加写日志，避免每次LLM调用后重写整个缓存文件
+                key_string_value_json_storage_cls=JsonlKVStorage,
+                llm_rate_limits=openai_config.get('rate_limits', {}),
+                # 插入时只抽取和合并实体，社区检测和报告留到构建知识图谱时统一执行
+                defer_community_reports=True,
+                # 按论文章节和段落切分，跳过参考文献，减少重复抽取
+                chunk_func=chunking_by_paper_structure,
             )
             
             self.is_initialized = True
@@ -136,9 +146,15 @@ class GraphRAGManager:
     
     async def extract_paper(self, paper_id: str, paper_data: Dict[str, Any]) -> bool:
         """异步抽取单个论文的实体和关系"""
+        results = await self.extract_papers({paper_id: paper_data})
+        return results[paper_id]
+    
+    async def extract_papers(self, papers: Dict[str, Dict[str, Any]]) -> Dict[str, bool]:
+        """批量抽取多篇论文：所有论文的文本块在同一次实体抽取中共享并发，按论文汇报进度"""
         async with self._extraction_lock:
-            try:
-                # 初始化进度跟踪
+            results = {}
+            doc_papers = {}
+            for paper_id, paper_data in papers.items():
                 self.extraction_progress[paper_id] = ExtractionProgress(
                     paper_id=paper_id,
                     paper_title=paper_data.get('title', 'Unknown'),
@@ -146,43 +162,61 @@ class GraphRAGManager:
                     progress=0.0,
                     status="processing"
                 )
-                
+            
+            try:
                 # 确保GraphRAG已初始化
                 if not self._initialize_graphrag():
                     raise Exception("GraphRAG初始化失败")
                 
-                # 准备文档内容
-                content = self._prepare_document_content(paper_data)
-                if not content.strip():
-                    raise Exception("论文内容为空")
-                
-                # 更新进度
-                self.extraction_progress[paper_id].current_step = "文本切分中..."
-                self.extraction_progress[paper_id].progress = 0.2
-                
-                # 使用GraphRAG进行插入和处理
-                await self.graphrag.ainsert(content)
-                
-                # 更新进度
-                self.extraction_progress[paper_id].current_step = "实体抽取中..."
-                self.extraction_progress[paper_id].progress = 0.6
+                # 准备文档内容，内容相同的论文对应同一个文档
+                contents = []
+                for paper_id, paper_data in papers.items():
+                    content = self._prepare_document_content(paper_data)
+                    if not content.strip():
+                        self._set_extraction_error(paper_id, "论文内容为空")
+                        results[paper_id] = False
+                        continue
+                    doc_id = compute_mdhash_id(content.strip(), prefix="doc-")
+                    doc_papers.setdefault(doc_id, []).append(paper_id)
+                    contents.append(content)
+                    self.extraction_progress[paper_id].current_step = "文本切分中..."
+                    self.extraction_progress[paper_id].progress = 0.1
                 
-                # 等待处理完成（这里可能需要轮询或其他机制）
-                await asyncio.sleep(2)  # 模拟处理时间
+                if contents:
+                    def on_progress(doc_id: str, step: str, fraction: float):
+                        for paper_id in doc_papers.get(doc_id, []):
+                            progress = self.extraction_progress[paper_id]
+                            if step == "entity_extraction":
+                                progress.current_step = f"实体抽取中 ({fraction:.0%})..."
+                                progress.progress = 0.1 + 0.7 * fraction
+                            elif step == "community_report":
+                                progress.current_step = "生成社区报告中..."
+                                progress.progress = 0.9
+                    
+                    await self.graphrag.ainsert(contents, progress_callback=on_progress)
                 
-                # 完成
-                self.extraction_progress[paper_id].current_step = "完成"
-                self.extraction_progress[paper_id].progress = 1.0
-                self.extraction_progress[paper_id].status = "completed"
-                
-                return True
+                # 已存在于存储中的论文不会产生进度回调，同样视为完成
+                for paper_ids in doc_papers.values():
+                    for paper_id in paper_ids:
+                        progress = self.extraction_progress[paper_id]
+                        progress.current_step = "完成"
+                        progress.progress = 1.0
+                        progress.status = "completed"
+                        results[paper_id] = True
                 
             except Exception as e:
-                # 错误处理
-                self.extraction_progress[paper_id].status = "error"
-                self.extraction_progress[paper_id].error_message = str(e)
-                print(f"论文抽取失败 {paper_id}: {e}")
-                return False
+                # 错误处理：同一批次的论文一起失败
+                for paper_id in papers:
+                    if paper_id not in results:
+                        self._set_extraction_error(paper_id, str(e))
+                        results[paper_id] = False
+                print(f"论文抽取失败 {list(papers)}: {e}")
+            
+            return results
+    
+    def _set_extraction_error(self, paper_id: str, error_message: str):
+        self.extraction_progress[paper_id].status = "error"
+        self.extraction_progress[paper_id].error_message = error_message
     
     def _prepare_document_content(self, paper_data: Dict[str, Any]) -> str:
         """准备文档内容用于抽取"""
@@ -218,21 +252,9 @@ class GraphRAGManager:
                 if not hasattr(self.graphrag, 'chunk_entity_relation_graph') or self.graphrag.chunk_entity_relation_graph is None:
                     raise Exception("没有找到已抽取的数据，请先抽取论文")
                 
-                # 社区检测
-                self.build_progress = {"status": "processing", "progress": 0.3, "message": "执行社区检测..."}
-                await self.graphrag.chunk_entity_relation_graph.clustering(
-                    self.graphrag.graph_cluster_algorithm
-                )
-                
-                # 生成社区摘要
-                self.build_progress = {"status": "processing", "progress": 0.6, "message": "生成社区摘要..."}
-                from .nano_graphrag._op import generate_community_report
-                from dataclasses import asdict
-                await generate_community_report(
-                    self.graphrag.community_reports, 
-                    self.graphrag.chunk_entity_relation_graph, 
-                    asdict(self.graphrag)
-                )
+                # 社区检测与生成社区摘要
+                self.build_progress = {"status": "processing", "progress": 0.3, "message": "执行社区检测并生成社区摘要..."}
+                await self.graphrag.abuild_communities()
                 
                 # 完成构建
                 self.build_progress = {"status": "processing", "progress": 0.9, "message": "完成构建..."}
@@ -5,6 +5,18 @@ from typing import List, Dict, Any, Callable, Optional, Union
 import time
 
 from .config_manager import ConfigManager
+from .nano_graphrag._rate_limit import (
+    RateLimitedError,
+    configure_rate_limits,
+    estimate_message_tokens,
+    estimate_tokens,
+    get_rate_limiter,
+    retry_after_from_headers,
+)
+from .nano_graphrag._utils import AsyncCallLimiter
+
+# 未在rate_limits中配置预算的模型，与原来一样最多3个并发请求
+DEFAULT_MAX_CONCURRENT_REQUESTS = 3
 
 class LLMClient:
     """LLM客户端，处理与OpenAI API的交互"""
@@ -12,7 +24,10 @@ class LLMClient:
     def __init__(self, config_manager: ConfigManager):
         self.config_manager = config_manager
         self.session = None
-        self._semaphore = asyncio.Semaphore(3)  # 限制并发请求数
+        # 按模型的RPM/TPM预算限流，未配置的模型仍使用固定的并发数
+        self._rate_limits = config_manager.get_openai_config().get('rate_limits', {})
+        configure_rate_limits(self._rate_limits)
+        self._default_slots = AsyncCallLimiter(DEFAULT_MAX_CONCURRENT_REQUESTS)
     
     async def _get_session(self):
         """获取或创建aiohttp会话"""
@@ -20,43 +35,83 @@ class LLMClient:
             self.session = aiohttp.ClientSession()
         return self.session
     
+    async def _rate_limited_call(self, model: str, func: Callable, estimated_tokens: int):
+        """经模型的限流器发送请求，未配置预算的模型先占用默认并发槽位"""
+        limiter = get_rate_limiter(model)
+        if model in self._rate_limits:
+            return await limiter.call(func, estimated_tokens=estimated_tokens)
+        await self._default_slots.acquire()
+        try:
+            return await limiter.call(func, estimated_tokens=estimated_tokens)
+        finally:
+            self._default_slots.release()
+    
     async def _make_request(self, url: str, headers: Dict[str, str], data: Dict[str, Any]) -> str:
         """发送HTTP请求"""
-        async with self._semaphore:
-            session = await self._get_session()
-            try:
-                async with session.post(url, headers=headers, json=data, timeout=60) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        return result['choices'][0]['message']['content']
-                    else:
-                        error_text = await response.text()
-                        raise Exception(f"API请求失败: {response.status}, {error_text}")
-            except asyncio.TimeoutError:
-                raise Exception("API请求超时")
-            except Exception as e:
-                raise Exception(f"API请求异常: {str(e)}")
+        estimated_tokens = estimate_message_tokens(data['messages']) + data.get('max_tokens', 0)
+        return await self._rate_limited_call(
+            data['model'],
+            lambda: self._post_chat(url, headers, data),
+            estimated_tokens,
+        )
+    
+    async def _post_chat(self, url: str, headers: Dict[str, str], data: Dict[str, Any]) -> str:
+        session = await self._get_session()
+        try:
+            async with session.post(url, headers=headers, json=data, timeout=60) as response:
+                if response.status == 200:
+                    result = await response.json()
+                    return result['choices'][0]['message']['content']
+                elif response.status == 429:
+                    # 交给限流器按服务端提示的时间重试
+                    raise RateLimitedError(
+                        f"API请求被限流: {await response.text()}",
+                        retry_after=retry_after_from_headers(response.headers),
+                    )
+                else:
+                    error_text = await response.text()
+                    raise Exception(f"API请求失败: {response.status}, {error_text}")
+        except RateLimitedError:
+            raise
+        except asyncio.TimeoutError:
+            raise Exception("API请求超时")
+        except Exception as e:
+            raise Exception(f"API请求异常: {str(e)}")
     
     async def _make_embedding_request(self, url: str, headers: Dict[str, str], texts: List[str]) -> List[List[float]]:
         """发送embedding请求"""
-        async with self._semaphore:
-            session = await self._get_session()
-            try:
-                data = {
-                    "input": texts,
-                    "model": "text-embedding-ada-002"
-                }
-                async with session.post(url, headers=headers, json=data, timeout=60) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        return [item['embedding'] for item in result['data']]
-                    else:
-                        error_text = await response.text()
-                        raise Exception(f"Embedding请求失败: {response.status}, {error_text}")
-            except asyncio.TimeoutError:
-                raise Exception("Embedding请求超时")
-            except Exception as e:
-                raise Exception(f"Embedding请求异常: {str(e)}")
+        model = "text-embedding-ada-002"
+        return await self._rate_limited_call(
+            model,
+            lambda: self._post_embedding(url, headers, model, texts),
+            estimate_tokens(texts),
+        )
+    
+    async def _post_embedding(self, url: str, headers: Dict[str, str], model: str, texts: List[str]) -> List[List[float]]:
+        session = await self._get_session()
+        try:
+            data = {
+                "input": texts,
+                "model": model
+            }
+            async with session.post(url, headers=headers, json=data, timeout=60) as response:
+                if response.status == 200:
+                    result = await response.json()
+                    return [item['embedding'] for item in result['data']]
+                elif response.status == 429:
+                    raise RateLimitedError(
+                        f"Embedding请求被限流: {await response.text()}",
+                        retry_after=retry_after_from_headers(response.headers),
+                    )
+                else:
+                    error_text = await response.text()
+                    raise Exception(f"Embedding请求失败: {response.status}, {error_text}")
+        except RateLimitedError:
+            raise
+        except asyncio.TimeoutError:
+            raise Exception("Embedding请求超时")
+        except Exception as e:
+            raise Exception(f"Embedding请求异常: {str(e)}")
     
     def create_llm_func(self, model_name: str) -> Callable:
         """创建LLM函数"""
@@ -2,7 +2,7 @@ import json
 import numpy as np
 from typing import Optional, List, Any, Callable
 
-from openai import AsyncOpenAI, AsyncAzureOpenAI, APIConnectionError, RateLimitError
+from openai import AsyncOpenAI, AsyncAzureOpenAI, APIConnectionError
 
 from tenacity import (
     retry,
@@ -12,6 +12,7 @@ from tenacity import (
 )
 import os
 
+from ._rate_limit import estimate_message_tokens, estimate_tokens, get_rate_limiter
 from ._utils import compute_args_hash, wrap_embedding_func_with_attrs
 from .base import BaseKVStorage
 
@@ -33,10 +34,42 @@ def get_azure_openai_async_client_instance():
     return global_azure_openai_async_client
 
 
+def _response_tokens(response) -> Optional[int]:
+    return response.usage.total_tokens if response.usage is not None else None
+
+
+def _tiktoken_model_name(hashing_kv: Optional[BaseKVStorage]) -> str:
+    if hashing_kv is None:
+        return "gpt-4o"
+    return hashing_kv.global_config.get("tiktoken_model_name", "gpt-4o")
+
+
+async def _rate_limited_completion(
+    client, model, messages, tiktoken_model_name="gpt-4o", **kwargs
+):
+    return await get_rate_limiter(model).call(
+        lambda: client.chat.completions.create(model=model, messages=messages, **kwargs),
+        # the completion budget counts against TPM like the prompt
+        estimated_tokens=estimate_message_tokens(messages, tiktoken_model_name)
+        + kwargs.get("max_tokens", 0),
+        actual_tokens=_response_tokens,
+    )
+
+
+async def _rate_limited_embedding(client, model, texts):
+    return await get_rate_limiter(model).call(
+        lambda: client.embeddings.create(
+            model=model, input=texts, encoding_format="float"
+        ),
+        estimated_tokens=estimate_tokens(texts),
+        actual_tokens=_response_tokens,
+    )
+
+
 @retry(
     stop=stop_after_attempt(5),
     wait=wait_exponential(multiplier=1, min=4, max=10),
-    retry=retry_if_exception_type((RateLimitError, APIConnectionError)),
+    retry=retry_if_exception_type(APIConnectionError),
 )
 async def openai_complete_if_cache(
     model, prompt, system_prompt=None, history_messages=[], **kwargs
@@ -49,20 +82,23 @@ async def openai_complete_if_cache(
     messages.extend(history_messages)
     messages.append({"role": "user", "content": prompt})
     if hashing_kv is not None:
-        args_hash = compute_args_hash(model, messages)
+        args_hash = compute_args_hash(model, messages, kwargs)
         if_cache_return = await hashing_kv.get_by_id(args_hash)
         if if_cache_return is not None:
             return if_cache_return["return"]
 
-    response = await openai_async_client.chat.completions.create(
-        model=model, messages=messages, **kwargs
+    response = await _rate_limited_completion(
+        openai_async_client,
+        model,
+        messages,
+        tiktoken_model_name=_tiktoken_model_name(hashing_kv),
+        **kwargs,
     )
 
     if hashing_kv is not None:
         await hashing_kv.upsert(
             {args_hash: {"return": response.choices[0].message.content, "model": model}}
         )
-        await hashing_kv.index_done_callback()
     return response.choices[0].message.content
 
 
@@ -97,12 +133,12 @@ async def gpt_4o_mini_complete(
 @retry(
     stop=stop_after_attempt(5),
     wait=wait_exponential(multiplier=1, min=4, max=10),
-    retry=retry_if_exception_type((RateLimitError, APIConnectionError)),
+    retry=retry_if_exception_type(APIConnectionError),
 )
 async def openai_embedding(texts: list[str]) -> np.ndarray:
     openai_async_client = get_openai_async_client_instance()
-    response = await openai_async_client.embeddings.create(
-        model="text-embedding-3-small", input=texts, encoding_format="float"
+    response = await _rate_limited_embedding(
+        openai_async_client, "text-embedding-3-small", texts
     )
     return np.array([dp.embedding for dp in response.data])
 
@@ -110,7 +146,7 @@ async def openai_embedding(texts: list[str]) -> np.ndarray:
 @retry(
     stop=stop_after_attempt(3),
     wait=wait_exponential(multiplier=1, min=4, max=10),
-    retry=retry_if_exception_type((RateLimitError, APIConnectionError)),
+    retry=retry_if_exception_type(APIConnectionError),
 )
 async def azure_openai_complete_if_cache(
     deployment_name, prompt, system_prompt=None, history_messages=[], **kwargs
@@ -123,13 +159,17 @@ async def azure_openai_complete_if_cache(
     messages.extend(history_messages)
     messages.append({"role": "user", "content": prompt})
     if hashing_kv is not None:
-        args_hash = compute_args_hash(deployment_name, messages)
+        args_hash = compute_args_hash(deployment_name, messages, kwargs)
         if_cache_return = await hashing_kv.get_by_id(args_hash)
         if if_cache_return is not None:
             return if_cache_return["return"]
 
-    response = await azure_openai_client.chat.completions.create(
-        model=deployment_name, messages=messages, **kwargs
+    response = await _rate_limited_completion(
+        azure_openai_client,
+        deployment_name,
+        messages,
+        tiktoken_model_name=_tiktoken_model_name(hashing_kv),
+        **kwargs,
     )
 
     if hashing_kv is not None:
@@ -141,7 +181,6 @@ async def azure_openai_complete_if_cache(
                 }
             }
         )
-        await hashing_kv.index_done_callback()
     return response.choices[0].message.content
 
 
@@ -173,11 +212,11 @@ async def azure_gpt_4o_mini_complete(
 @retry(
     stop=stop_after_attempt(3),
     wait=wait_exponential(multiplier=1, min=4, max=10),
-    retry=retry_if_exception_type((RateLimitError, APIConnectionError)),
+    retry=retry_if_exception_type(APIConnectionError),
 )
 async def azure_openai_embedding(texts: list[str]) -> np.ndarray:
     azure_openai_client = get_azure_openai_async_client_instance()
-    response = await azure_openai_client.embeddings.create(
-        model="text-embedding-3-small", input=texts, encoding_format="float"
+    response = await _rate_limited_embedding(
+        azure_openai_client, "text-embedding-3-small", texts
     )
     return np.array([dp.embedding for dp in response.data])
@@ -1,16 +1,18 @@
 import re
 import json
 import asyncio
-import tiktoken
-from typing import Union
+import multiprocessing
+import xxhash
+from typing import Callable, Union
 from collections import Counter, defaultdict
-from ._splitter import SeparatorSplitter
+from concurrent.futures import ProcessPoolExecutor
+from ._splitter import SeparatorSplitter, split_paper_sections
 from ._utils import (
     logger,
+    Tokenizer,
     clean_str,
     compute_mdhash_id,
-    decode_tokens_by_tiktoken,
-    encode_string_by_tiktoken,
+    get_tokenizer,
     is_float_regex,
     list_of_list_to_csv,
     pack_user_ass_to_openai_messages,
@@ -98,17 +100,145 @@ def chunking_by_seperators(
     return results
 
 
-def get_chunks(new_docs, chunk_func=chunking_by_token_size, **chunk_func_params):
+def chunking_by_paper_structure(
+    tokens_list: list[list[int]],
+    doc_keys,
+    tiktoken_model,
+    overlap_token_size=128,
+    max_token_size=1024,
+    drop_references=True,
+):
+    """Chunk papers along their sections and paragraphs.
+
+    Whole sections are packed together up to `max_token_size`, larger ones
+    fill chunks paragraph by paragraph with their heading repeated, and only
+    a paragraph longer than a chunk is split by separators with overlap. The
+    reference list is left out with `drop_references`.
+    """
+    separators = [tiktoken_model.encode(s) for s in PROMPTS["default_text_separator"]]
+    splitter = SeparatorSplitter(
+        separators=separators,
+        chunk_size=max_token_size,
+        chunk_overlap=overlap_token_size,
+    )
+    # tokens of the paragraph break joining the parts of a chunk
+    break_tokens = len(tiktoken_model.encode("\n\n"))
+    results = []
+    for index, tokens in enumerate(tokens_list):
+        sections = split_paper_sections(
+            tiktoken_model.decode(tokens), drop_references=drop_references
+        )
+        chunks = []
+        current, current_tokens = [], 0
+
+        def _flush():
+            nonlocal current, current_tokens
+            if current:
+                chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+
+        def _add(text: str, num_tokens: int):
+            nonlocal current_tokens
+            if current and current_tokens + break_tokens + num_tokens > max_token_size:
+                _flush()
+            current_tokens += num_tokens + (break_tokens if current else 0)
+            current.append(text)
+
+        for heading, paragraphs in sections:
+            parts = ([heading] if heading else []) + paragraphs
+            parts_tokens = tiktoken_model.encode_batch(parts)
+            section_tokens = sum(len(t) for t in parts_tokens) + break_tokens * (
+                len(parts) - 1
+            )
+            if (
+                current
+                and current_tokens + break_tokens + section_tokens > max_token_size
+            ):
+                # start the section on a new chunk unless that wastes over half of
+                # the one in progress
+                if current_tokens >= max_token_size // 2:
+                    _flush()
+            if (
+                current_tokens + (break_tokens if current else 0) + section_tokens
+                <= max_token_size
+            ):
+                _add("\n\n".join(parts), section_tokens)
+                continue
+            # otherwise its paragraphs fill up the chunk in progress
+            heading_tokens = len(parts_tokens[0]) + break_tokens if heading else 0
+            for i, (paragraph, paragraph_tokens) in enumerate(
+                zip(paragraphs, parts_tokens[len(parts) - len(paragraphs) :])
+            ):
+                num_tokens = len(paragraph_tokens)
+                if num_tokens > max_token_size:
+                    _flush()
+                    # the heading goes in front of the first piece, so the pieces
+                    # leave room for it
+                    with_heading = (
+                        heading
+                        and i == 0
+                        and max_token_size - heading_tokens > overlap_token_size
+                    )
+                    paragraph_splitter = (
+                        SeparatorSplitter(
+                            separators=separators,
+                            chunk_size=max_token_size - heading_tokens,
+                            chunk_overlap=overlap_token_size,
+                        )
+                        if with_heading
+                        else splitter
+                    )
+                    pieces = tiktoken_model.decode_batch(
+                        paragraph_splitter.split_tokens(paragraph_tokens)
+                    )
+                    if with_heading:
+                        pieces[0] = f"{heading}\n\n{pieces[0]}"
+                    chunks.extend(pieces)
+                    continue
+                # the first chunk of the section and its continuations start
+                # with the heading
+                with_heading = heading and (i == 0 or not current)
+                needed = num_tokens + (heading_tokens if with_heading else 0)
+                if current and current_tokens + break_tokens + needed > max_token_size:
+                    _flush()
+                    with_heading = bool(heading)
+                if with_heading and heading_tokens + num_tokens <= max_token_size:
+                    _add(heading, heading_tokens - break_tokens)
+                _add(paragraph, num_tokens)
+        _flush()
+
+        chunks = [c.strip() for c in chunks if c.strip()]
+        for i, (chunk, chunk_tokens) in enumerate(
+            zip(chunks, tiktoken_model.encode_batch(chunks))
+        ):
+            results.append(
+                {
+                    "tokens": len(chunk_tokens),
+                    "content": chunk,
+                    "chunk_order_index": i,
+                    "full_doc_id": doc_keys[index],
+                }
+            )
+
+    return results
+
+
+def get_chunks(
+    new_docs,
+    chunk_func=chunking_by_token_size,
+    tiktoken_model_name: str = "gpt-4o",
+    **chunk_func_params,
+):
     inserting_chunks = {}
 
     new_docs_list = list(new_docs.items())
     docs = [new_doc[1]["content"] for new_doc in new_docs_list]
     doc_keys = [new_doc[0] for new_doc in new_docs_list]
 
-    ENCODER = tiktoken.encoding_for_model("gpt-4o")
-    tokens = ENCODER.encode_batch(docs, num_threads=16)
+    tokenizer = get_tokenizer(tiktoken_model_name)
+    tokens = tokenizer.encode_batch(docs, num_threads=16)
     chunks = chunk_func(
-        tokens, doc_keys=doc_keys, tiktoken_model=ENCODER, **chunk_func_params
+        tokens, doc_keys=doc_keys, tiktoken_model=tokenizer.encoding, **chunk_func_params
     )
 
     for chunk in chunks:
@@ -119,6 +249,69 @@ def get_chunks(new_docs, chunk_func=chunking_by_token_size, **chunk_func_params)
     return inserting_chunks
 
 
+def _get_chunks_of_docs(
+    docs: list[tuple[str, dict]],
+    chunk_func,
+    tiktoken_model_name: str,
+    chunk_func_params: dict,
+) -> dict[str, TextChunkSchema]:
+    # runs in a worker process, see `get_chunks_in_process_pool`
+    return get_chunks(
+        dict(docs),
+        chunk_func=chunk_func,
+        tiktoken_model_name=tiktoken_model_name,
+        **chunk_func_params,
+    )
+
+
+async def get_chunks_in_process_pool(
+    new_docs,
+    chunk_func=chunking_by_token_size,
+    tiktoken_model_name: str = "gpt-4o",
+    max_workers: int = 4,
+    docs_per_task: int = 16,
+    **chunk_func_params,
+) -> dict[str, TextChunkSchema]:
+    """`get_chunks` run in worker processes, `chunk_func` must be picklable.
+
+    Documents are sent out in tasks of `docs_per_task` and the event loop is
+    free while they are chunked. Chunks come back as tasks complete and are
+    returned in document order.
+    """
+    docs = list(new_docs.items())
+    tasks = [docs[i : i + docs_per_task] for i in range(0, len(docs), docs_per_task)]
+    results = [None] * len(tasks)
+    done_docs = 0
+    loop = asyncio.get_running_loop()
+    # spawn: a forked child may inherit locks held by the parent's other threads
+    pool = ProcessPoolExecutor(
+        max_workers=min(max_workers, len(tasks)),
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+    async def _run_task(index: int, task: list[tuple[str, dict]]):
+        nonlocal done_docs
+        results[index] = await loop.run_in_executor(
+            pool,
+            _get_chunks_of_docs,
+            task,
+            chunk_func,
+            tiktoken_model_name,
+            chunk_func_params,
+        )
+        done_docs += len(task)
+        logger.debug(f"Chunked {done_docs}/{len(docs)} docs")
+
+    try:
+        await asyncio.gather(*[_run_task(i, task) for i, task in enumerate(tasks)])
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    inserting_chunks = {}
+    for chunks in results:
+        inserting_chunks.update(chunks)
+    return inserting_chunks
+
+
 async def _handle_entity_relation_summary(
     entity_or_relation_name: str,
     description: str,
@@ -129,13 +322,16 @@ async def _handle_entity_relation_summary(
     tiktoken_model_name = global_config["tiktoken_model_name"]
     summary_max_tokens = global_config["entity_summary_to_max_tokens"]
 
-    tokens = encode_string_by_tiktoken(description, model_name=tiktoken_model_name)
-    if len(tokens) < summary_max_tokens:  # No need for summary
+    tokenizer = get_tokenizer(tiktoken_model_name)
+    num_tokens = tokenizer.count(description)
+    if num_tokens < summary_max_tokens:  # No need for summary
         return description
     prompt_template = PROMPTS["summarize_entity_descriptions"]
-    use_description = decode_tokens_by_tiktoken(
-        tokens[:llm_max_tokens], model_name=tiktoken_model_name
-    )
+    use_description = description
+    if num_tokens > llm_max_tokens:
+        use_description = tokenizer.decode(
+            tokenizer.encode(description)[:llm_max_tokens]
+        )
     context_base = dict(
         entity_name=entity_or_relation_name,
         description_list=use_description.split(GRAPH_FIELD_SEP),
@@ -146,7 +342,100 @@ async def _handle_entity_relation_summary(
     return summary
 
 
-async def _handle_single_entity_extraction(
+async def _handle_entity_relation_summaries(
+    names: list[Union[str, tuple[str, str]]],
+    descriptions: list[str],
+    global_config: dict,
+) -> list[str]:
+    """Summarize the over-long descriptions, several per cheap-model request.
+
+    Descriptions a batched response leaves out are summarized one by one.
+    """
+    use_llm_func: callable = global_config["cheap_model_func"]
+    llm_max_tokens = global_config["cheap_model_max_token_size"]
+    tiktoken_model_name = global_config["tiktoken_model_name"]
+    summary_max_tokens = global_config["entity_summary_to_max_tokens"]
+    batch_size = global_config["entity_summary_batch_size"]
+    use_string_json_convert_func: callable = global_config[
+        "convert_response_to_json_func"
+    ]
+
+    tokenizer = get_tokenizer(tiktoken_model_name)
+    results = list(descriptions)
+    counts = tokenizer.count_batch(descriptions)
+    groups = []
+    group, group_tokens = [], 0
+    for i, count in enumerate(counts):
+        if count < summary_max_tokens:  # No need for summary
+            continue
+        num_tokens = min(count, llm_max_tokens)
+        if group and (
+            len(group) >= batch_size or group_tokens + num_tokens > llm_max_tokens
+        ):
+            groups.append(group)
+            group, group_tokens = [], 0
+        group.append(i)
+        group_tokens += num_tokens
+    if group:
+        groups.append(group)
+
+    async def _summarize_one(i: int):
+        results[i] = await _handle_entity_relation_summary(
+            names[i], descriptions[i], global_config
+        )
+
+    async def _summarize_group(group: list[int]):
+        if len(group) == 1:
+            return await _summarize_one(group[0])
+        items = []
+        for item_id, i in enumerate(group):
+            use_description = descriptions[i]
+            if counts[i] > llm_max_tokens:
+                use_description = tokenizer.decode(
+                    tokenizer.encode(use_description)[:llm_max_tokens]
+                )
+            items.append(
+                PROMPTS["summarize_entity_descriptions_batch_item"].format(
+                    id=item_id,
+                    entity_name=names[i],
+                    description_list=use_description.split(GRAPH_FIELD_SEP),
+                )
+            )
+        use_prompt = PROMPTS["summarize_entity_descriptions_batch"].format(
+            items="\n".join(items)
+        )
+        logger.debug(f"Trigger batched summary of {len(group)} descriptions")
+        response = await use_llm_func(
+            use_prompt,
+            max_tokens=summary_max_tokens * len(group),
+            response_format={"type": "json_object"},
+        )
+        data = use_string_json_convert_func(response)
+        summaries = data.get("summaries") if isinstance(data, dict) else None
+        summaries = {
+            str(s.get("id")): s.get("summary")
+            for s in (summaries if isinstance(summaries, list) else [])
+            if isinstance(s, dict)
+        }
+        missed = []
+        for item_id, i in enumerate(group):
+            summary = summaries.get(str(item_id))
+            if isinstance(summary, str) and summary.strip():
+                results[i] = summary
+            else:
+                missed.append(i)
+        if missed:
+            logger.warning(
+                f"Batched summary missed {len(missed)}/{len(group)} descriptions, "
+                "summarizing them one by one"
+            )
+            await asyncio.gather(*[_summarize_one(i) for i in missed])
+
+    await asyncio.gather(*[_summarize_group(g) for g in groups])
+    return results
+
+
+def _handle_single_entity_extraction(
     record_attributes: list[str],
     chunk_key: str,
 ):
@@ -167,7 +456,7 @@ async def _handle_single_entity_extraction(
     )
 
 
-async def _handle_single_relationship_extraction(
+def _handle_single_relationship_extraction(
     record_attributes: list[str],
     chunk_key: str,
 ):
@@ -190,23 +479,73 @@ async def _handle_single_relationship_extraction(
     )
 
 
-async def _merge_nodes_then_upsert(
-    entity_name: str,
+class ExtractionOutputParser:
+    """Parser of the tuple-delimited records returned by entity extraction.
+
+    Patterns are compiled once per set of delimiters and the whole output is
+    parsed synchronously into nodes and edges grouped like `_merge_*` expects.
+    """
+
+    def __init__(
+        self, tuple_delimiter: str, record_delimiter: str, completion_delimiter: str
+    ):
+        self._record_pattern = re.compile(
+            f"{re.escape(record_delimiter)}|{re.escape(completion_delimiter)}"
+        )
+        self._tuple_pattern = re.compile(re.escape(tuple_delimiter))
+        self._body_pattern = re.compile(r"\((.*)\)")
+
+    def parse(
+        self, result: str, chunk_key: str
+    ) -> tuple[dict[str, list[dict]], dict[tuple[str, str], list[dict]]]:
+        maybe_nodes = defaultdict(list)
+        maybe_edges = defaultdict(list)
+        split_tuple = self._tuple_pattern.split
+        search_body = self._body_pattern.search
+        for record in self._record_pattern.split(result):
+            record = search_body(record)
+            if record is None:
+                continue
+            record_attributes = [
+                a for a in (a.strip() for a in split_tuple(record.group(1))) if a
+            ]
+            if not record_attributes:
+                continue
+            if record_attributes[0] == '"entity"':
+                if_entities = _handle_single_entity_extraction(
+                    record_attributes, chunk_key
+                )
+                if if_entities is not None:
+                    maybe_nodes[if_entities["entity_name"]].append(if_entities)
+            elif record_attributes[0] == '"relationship"':
+                if_relation = _handle_single_relationship_extraction(
+                    record_attributes, chunk_key
+                )
+                if if_relation is not None:
+                    maybe_edges[
+                        (if_relation["src_id"], if_relation["tgt_id"])
+                    ].append(if_relation)
+        return dict(maybe_nodes), dict(maybe_edges)
+
+
+def _merge_nodes(
     nodes_data: list[dict],
-    knwoledge_graph_inst: BaseGraphStorage,
-    global_config: dict,
-):
+    already_node: Union[dict, None] = None,
+) -> dict:
+    """Node data of the extracted `nodes_data` merged with the stored node, unsummarized"""
     already_entitiy_types = []
     already_source_ids = []
     already_description = []
 
-    already_node = await knwoledge_graph_inst.get_node(entity_name)
     if already_node is not None:
         already_entitiy_types.append(already_node["entity_type"])
         already_source_ids.extend(
             split_string_by_multi_markers(already_node["source_id"], [GRAPH_FIELD_SEP])
         )
-        already_description.append(already_node["description"])
+        # split so that merging in several steps orders descriptions like one merge
+        already_description.extend(
+            split_string_by_multi_markers(already_node["description"], [GRAPH_FIELD_SEP])
+        )
 
     entity_type = sorted(
         Counter(
@@ -221,40 +560,30 @@ async def _merge_nodes_then_upsert(
     source_id = GRAPH_FIELD_SEP.join(
         set([dp["source_id"] for dp in nodes_data] + already_source_ids)
     )
-    description = await _handle_entity_relation_summary(
-        entity_name, description, global_config
-    )
-    node_data = dict(
+    return dict(
         entity_type=entity_type,
         description=description,
         source_id=source_id,
     )
-    await knwoledge_graph_inst.upsert_node(
-        entity_name,
-        node_data=node_data,
-    )
-    node_data["entity_name"] = entity_name
-    return node_data
 
 
-async def _merge_edges_then_upsert(
-    src_id: str,
-    tgt_id: str,
+def _merge_edges(
     edges_data: list[dict],
-    knwoledge_graph_inst: BaseGraphStorage,
-    global_config: dict,
-):
+    already_edge: Union[dict, None] = None,
+) -> dict:
+    """Edge data of the extracted `edges_data` merged with the stored edge, unsummarized"""
     already_weights = []
     already_source_ids = []
     already_description = []
     already_order = []
-    if await knwoledge_graph_inst.has_edge(src_id, tgt_id):
-        already_edge = await knwoledge_graph_inst.get_edge(src_id, tgt_id)
+    if already_edge is not None:
         already_weights.append(already_edge["weight"])
         already_source_ids.extend(
             split_string_by_multi_markers(already_edge["source_id"], [GRAPH_FIELD_SEP])
         )
-        already_description.append(already_edge["description"])
+        already_description.extend(
+            split_string_by_multi_markers(already_edge["description"], [GRAPH_FIELD_SEP])
+        )
         already_order.append(already_edge.get("order", 1))
 
     # [numberchiffre]: `Relationship.order` is only returned from DSPy's predictions
@@ -266,25 +595,8 @@ async def _merge_edges_then_upsert(
     source_id = GRAPH_FIELD_SEP.join(
         set([dp["source_id"] for dp in edges_data] + already_source_ids)
     )
-    for need_insert_id in [src_id, tgt_id]:
-        if not (await knwoledge_graph_inst.has_node(need_insert_id)):
-            await knwoledge_graph_inst.upsert_node(
-                need_insert_id,
-                node_data={
-                    "source_id": source_id,
-                    "description": description,
-                    "entity_type": '"UNKNOWN"',
-                },
-            )
-    description = await _handle_entity_relation_summary(
-        (src_id, tgt_id), description, global_config
-    )
-    await knwoledge_graph_inst.upsert_edge(
-        src_id,
-        tgt_id,
-        edge_data=dict(
-            weight=weight, description=description, source_id=source_id, order=order
-        ),
+    return dict(
+        weight=weight, description=description, source_id=source_id, order=order
     )
 
 
@@ -294,9 +606,13 @@ async def extract_entities(
     entity_vdb: BaseVectorStorage,
     global_config: dict,
     using_amazon_bedrock: bool=False,
+    on_chunk_done: Callable[[str, TextChunkSchema], None] = None,
 ) -> Union[BaseGraphStorage, None]:
     use_llm_func: callable = global_config["best_model_func"]
     entity_extract_max_gleaning = global_config["entity_extract_max_gleaning"]
+    entity_extract_gleaning_min_records = global_config[
+        "entity_extract_gleaning_min_records"
+    ]
 
     ordered_chunks = list(chunks.items())
 
@@ -314,61 +630,81 @@ async def extract_entities(
     already_entities = 0
     already_relations = 0
 
-    async def _process_single_content(chunk_key_dp: tuple[str, TextChunkSchema]):
-        nonlocal already_processed, already_entities, already_relations
-        chunk_key = chunk_key_dp[0]
-        chunk_dp = chunk_key_dp[1]
-        content = chunk_dp["content"]
-        hint_prompt = entity_extract_prompt.format(**context_base, input_text=content)
-        final_result = await use_llm_func(hint_prompt)
-        if isinstance(final_result, list):
-            final_result = final_result[0]["text"]
-
-        history = pack_user_ass_to_openai_messages(hint_prompt, final_result, using_amazon_bedrock)
-        for now_glean_index in range(entity_extract_max_gleaning):
-            glean_result = await use_llm_func(continue_prompt, history_messages=history)
-
-            history += pack_user_ass_to_openai_messages(continue_prompt, glean_result, using_amazon_bedrock)
-            final_result += glean_result
-            if now_glean_index == entity_extract_max_gleaning - 1:
-                break
-
-            if_loop_result: str = await use_llm_func(
-                if_loop_prompt, history_messages=history
-            )
-            if_loop_result = if_loop_result.strip().strip('"').strip("'").lower()
-            if if_loop_result != "yes":
-                break
+    parser = ExtractionOutputParser(
+        context_base["tuple_delimiter"],
+        context_base["record_delimiter"],
+        context_base["completion_delimiter"],
+    )
 
-        records = split_string_by_multi_markers(
-            final_result,
-            [context_base["record_delimiter"], context_base["completion_delimiter"]],
+    def _count_records(result: str) -> int:
+        return result.count(context_base["record_delimiter"]) + (
+            1 if "(" in result else 0
         )
 
-        maybe_nodes = defaultdict(list)
-        maybe_edges = defaultdict(list)
-        for record in records:
-            record = re.search(r"\((.*)\)", record)
-            if record is None:
-                continue
-            record = record.group(1)
-            record_attributes = split_string_by_multi_markers(
-                record, [context_base["tuple_delimiter"]]
+    tokenizer = get_tokenizer(global_config["tiktoken_model_name"])
+
+    # prompt/completion tokens and new records of every extraction round, round 0
+    # is the first pass and round i the i-th gleaning
+    round_stats = defaultdict(
+        lambda: dict(calls=0, prompt_tokens=0, completion_tokens=0, records=0)
+    )
+
+    async def _call_llm(round_index: int, state: dict, prompt: str, **kwargs) -> str:
+        result = await use_llm_func(prompt, **kwargs)
+        if isinstance(result, list):
+            result = result[0]["text"]
+        # the history is resent with every call
+        prompt_tokens, completion_tokens = tokenizer.count_batch(
+            [prompt, result], cache=False
+        )
+        stats = round_stats[round_index]
+        stats["calls"] += 1
+        stats["prompt_tokens"] += state["history_tokens"] + prompt_tokens
+        stats["completion_tokens"] += completion_tokens
+        state["last_call_tokens"] = prompt_tokens + completion_tokens
+        return result
+
+    async def _run_round(round_index: int, state: dict) -> bool:
+        """Run one extraction round of a chunk, return whether another is needed"""
+        if round_index == 0:
+            hint_prompt = entity_extract_prompt.format(
+                **context_base, input_text=state["chunk_dp"]["content"]
             )
-            if_entities = await _handle_single_entity_extraction(
-                record_attributes, chunk_key
+            state["final_result"] = await _call_llm(0, state, hint_prompt)
+            state["history"] = pack_user_ass_to_openai_messages(
+                hint_prompt, state["final_result"], using_amazon_bedrock
             )
-            if if_entities is not None:
-                maybe_nodes[if_entities["entity_name"]].append(if_entities)
-                continue
-
-            if_relation = await _handle_single_relationship_extraction(
-                record_attributes, chunk_key
+            state["history_tokens"] = state["last_call_tokens"]
+            num_records = _count_records(state["final_result"])
+            round_stats[0]["records"] += num_records
+            # a chunk that yields little on the first pass rarely has more to glean
+            return (
+                entity_extract_max_gleaning > 0
+                and num_records >= entity_extract_gleaning_min_records
             )
-            if if_relation is not None:
-                maybe_edges[(if_relation["src_id"], if_relation["tgt_id"])].append(
-                    if_relation
-                )
+
+        glean_result = await _call_llm(
+            round_index, state, continue_prompt, history_messages=state["history"]
+        )
+        state["history"] += pack_user_ass_to_openai_messages(
+            continue_prompt, glean_result, using_amazon_bedrock
+        )
+        state["history_tokens"] += state["last_call_tokens"]
+        state["final_result"] += glean_result
+        round_stats[round_index]["records"] += _count_records(glean_result)
+        if round_index == entity_extract_max_gleaning:
+            return False
+
+        if_loop_result: str = await _call_llm(
+            round_index, state, if_loop_prompt, history_messages=state["history"]
+        )
+        if_loop_result = if_loop_result.strip().strip('"').strip("'").lower()
+        return if_loop_result == "yes"
+
+    def _finish_chunk(state: dict):
+        nonlocal already_processed, already_entities, already_relations
+        chunk_key = state["chunk_key"]
+        maybe_nodes, maybe_edges = parser.parse(state["final_result"], chunk_key)
         already_processed += 1
         already_entities += len(maybe_nodes)
         already_relations += len(maybe_edges)
@@ -380,13 +716,159 @@ async def extract_entities(
             end="",
             flush=True,
         )
-        return dict(maybe_nodes), dict(maybe_edges)
+        if on_chunk_done is not None:
+            on_chunk_done(chunk_key, state["chunk_dp"])
+        return maybe_nodes, maybe_edges
+
+    # extract -> merge -> embed run as concurrent stages joined by bounded
+    # queues, a full queue pauses the stage feeding it
+    merge_batch_size = global_config["entity_merge_batch_size"]
+    extracted_queue = asyncio.Queue(maxsize=merge_batch_size)
+    embed_queue = asyncio.Queue(maxsize=2)
+    num_entities = 0
+
+    async def _extract_stage():
+        # (round, chunk order, state): the first pass of every chunk is scheduled
+        # before any gleaning round, so a large batch gets its useful work first
+        work_queue = asyncio.PriorityQueue()
+        for order, (chunk_key, chunk_dp) in enumerate(ordered_chunks):
+            work_queue.put_nowait(
+                (0, order, dict(chunk_key=chunk_key, chunk_dp=chunk_dp, history_tokens=0))
+            )
+        remaining = len(ordered_chunks)
+        # one worker per allowed LLM call keeps the model busy without piling
+        # finished results up behind the queue
+        num_workers = min(global_config["best_model_max_async"], len(ordered_chunks))
+
+        async def _extract_worker():
+            nonlocal remaining
+            while True:
+                round_index, order, state = await work_queue.get()
+                if state is None:
+                    return
+                if await _run_round(round_index, state):
+                    work_queue.put_nowait((round_index + 1, order, state))
+                    continue
+                await extracted_queue.put(_finish_chunk(state))
+                remaining -= 1
+                if remaining == 0:
+                    for i in range(num_workers):
+                        work_queue.put_nowait((float("inf"), i, None))
+
+        await asyncio.gather(*[_extract_worker() for _ in range(num_workers)])
+        print()  # clear the progress bar
+        for round_index, stats in sorted(round_stats.items()):
+            logger.info(
+                f"Extraction round {round_index}: {stats['calls']} calls, "
+                f"{stats['prompt_tokens']} prompt tokens, "
+                f"{stats['completion_tokens']} completion tokens, "
+                f"{stats['records']} records"
+            )
+        await extracted_queue.put(None)
+
+    async def _merge_stage():
+        nonlocal num_entities
+        batch = []
+        # nodes and edges merged by an earlier batch are held back to one final
+        # merge, so an entity recurring across batches is summarized and
+        # embedded at most twice per insert instead of once per batch
+        merged_nodes, merged_edges = set(), set()
+        deferred = []
+        while True:
+            result = await extracted_queue.get()
+            if result is not None:
+                batch.append(result)
+            else:
+                batch.extend(deferred)
+            if batch and (result is None or len(batch) >= merge_batch_size):
+                if result is not None:
+                    batch, held_back = _split_merged_results(
+                        batch, merged_nodes, merged_edges
+                    )
+                    deferred.append(held_back)
+                    for m_nodes, m_edges in batch:
+                        merged_nodes.update(m_nodes)
+                        merged_edges.update(tuple(sorted(k)) for k in m_edges)
+                entities_data = await _merge_extraction_results(
+                    batch, knwoledge_graph_inst, global_config
+                )
+                num_entities += len(entities_data)
+                batch = []
+                if entity_vdb is not None and entities_data:
+                    await embed_queue.put(entities_data)
+            if result is None:
+                break
+        await embed_queue.put(None)
+
+    async def _embed_stage():
+        done = False
+        while not done:
+            batches = [await embed_queue.get()]
+            # coalesce what queued up during the last upsert, later merges win
+            while not embed_queue.empty():
+                batches.append(embed_queue.get_nowait())
+            done = batches[-1] is None
+            data_for_vdb = {
+                compute_mdhash_id(dp["entity_name"], prefix="ent-"): {
+                    "content": dp["entity_name"] + dp["description"],
+                    "entity_name": dp["entity_name"],
+                }
+                for entities_data in batches
+                if entities_data is not None
+                for dp in entities_data
+            }
+            if data_for_vdb:
+                await entity_vdb.upsert(data_for_vdb)
 
-    # use_llm_func is wrapped in ascynio.Semaphore, limiting max_async callings
-    results = await asyncio.gather(
-        *[_process_single_content(c) for c in ordered_chunks]
-    )
-    print()  # clear the progress bar
+    stages = [
+        asyncio.create_task(_extract_stage()),
+        asyncio.create_task(_merge_stage()),
+        asyncio.create_task(_embed_stage()),
+    ]
+    try:
+        await asyncio.gather(*stages)
+    except BaseException:
+        # the other stages would wait on their queues forever
+        for stage in stages:
+            stage.cancel()
+        raise
+    if not num_entities:
+        logger.warning("Didn't extract any entities, maybe your LLM is not working")
+        return None
+    return knwoledge_graph_inst
+
+
+def _split_merged_results(
+    results: list[tuple[dict, dict]], merged_nodes: set, merged_edges: set
+) -> tuple[list[tuple[dict, dict]], tuple[dict, dict]]:
+    """Split extraction results into the not yet merged part and the rest"""
+    new_results = []
+    held_nodes, held_edges = defaultdict(list), defaultdict(list)
+    for m_nodes, m_edges in results:
+        new_nodes, new_edges = {}, {}
+        for k, v in m_nodes.items():
+            if k in merged_nodes:
+                held_nodes[k].extend(v)
+            else:
+                new_nodes[k] = v
+        for k, v in m_edges.items():
+            if tuple(sorted(k)) in merged_edges:
+                held_edges[k].extend(v)
+            else:
+                new_edges[k] = v
+        new_results.append((new_nodes, new_edges))
+    return new_results, (dict(held_nodes), dict(held_edges))
+
+
+async def _merge_extraction_results(
+    results: list[tuple[dict, dict]],
+    knwoledge_graph_inst: BaseGraphStorage,
+    global_config: dict,
+) -> list[dict]:
+    """Merge the nodes and edges extracted from some chunks into the graph.
+
+    Stored nodes and edges are fetched, summarized and upserted in batches.
+    """
     maybe_nodes = defaultdict(list)
     maybe_edges = defaultdict(list)
     for m_nodes, m_edges in results:
@@ -395,37 +877,73 @@ async def extract_entities(
         for k, v in m_edges.items():
             # it's undirected graph
             maybe_edges[tuple(sorted(k))].extend(v)
-    all_entities_data = await asyncio.gather(
-        *[
-            _merge_nodes_then_upsert(k, v, knwoledge_graph_inst, global_config)
-            for k, v in maybe_nodes.items()
-        ]
+    node_ids = list(maybe_nodes.keys())
+    edge_keys = list(maybe_edges.keys())
+    already_nodes = await knwoledge_graph_inst.get_nodes_batch(node_ids)
+    already_edges = await knwoledge_graph_inst.get_edges_batch(edge_keys)
+    endpoint_ids = list(set(n for k in edge_keys for n in k) - set(node_ids))
+    endpoints_exist = await knwoledge_graph_inst.has_nodes_batch(endpoint_ids)
+
+    nodes = [
+        _merge_nodes(v, already_node)
+        for v, already_node in zip(maybe_nodes.values(), already_nodes)
+    ]
+    edges = [
+        _merge_edges(v, already_edge)
+        for v, already_edge in zip(maybe_edges.values(), already_edges)
+    ]
+    # endpoints that were never extracted as entities get the unsummarized data
+    # of the first edge touching them
+    missing_node_ids = set(
+        n for n, exists in zip(endpoint_ids, endpoints_exist) if not exists
     )
-    await asyncio.gather(
-        *[
-            _merge_edges_then_upsert(k[0], k[1], v, knwoledge_graph_inst, global_config)
-            for k, v in maybe_edges.items()
-        ]
+    missing_nodes = []
+    for k, edge in zip(edge_keys, edges):
+        for need_insert_id in k:
+            if need_insert_id in missing_node_ids:
+                missing_node_ids.discard(need_insert_id)
+                missing_nodes.append(
+                    (
+                        need_insert_id,
+                        {
+                            "source_id": edge["source_id"],
+                            "description": edge["description"],
+                            "entity_type": '"UNKNOWN"',
+                        },
+                    )
+                )
+
+    summaries = await _handle_entity_relation_summaries(
+        node_ids + edge_keys,
+        [dp["description"] for dp in nodes + edges],
+        global_config,
     )
-    if not len(all_entities_data):
-        logger.warning("Didn't extract any entities, maybe your LLM is not working")
-        return None
-    if entity_vdb is not None:
-        data_for_vdb = {
-            compute_mdhash_id(dp["entity_name"], prefix="ent-"): {
-                "content": dp["entity_name"] + dp["description"],
-                "entity_name": dp["entity_name"],
-            }
-            for dp in all_entities_data
-        }
-        await entity_vdb.upsert(data_for_vdb)
-    return knwoledge_graph_inst
+    for dp, summary in zip(nodes + edges, summaries):
+        dp["description"] = summary
+    # stored so that queries can truncate without re-encoding
+    all_datas = nodes + edges + [node_data for _, node_data in missing_nodes]
+    tokenizer = get_tokenizer(global_config["tiktoken_model_name"])
+    description_tokens = tokenizer.count_batch([dp["description"] for dp in all_datas])
+    for dp, num_tokens in zip(all_datas, description_tokens):
+        dp["description_tokens"] = num_tokens
+
+    await knwoledge_graph_inst.upsert_nodes_batch(
+        list(zip(node_ids, nodes)) + missing_nodes
+    )
+    await knwoledge_graph_inst.upsert_edges_batch(
+        [(k[0], k[1], edge) for k, edge in zip(edge_keys, edges)]
+    )
+    return [
+        dict(node_data, entity_name=entity_name)
+        for entity_name, node_data in zip(node_ids, nodes)
+    ]
 
 
 def _pack_single_community_by_sub_communities(
     community: SingleCommunitySchema,
     max_token_size: int,
     already_reports: dict[str, CommunitySchema],
+    tokenizer: Tokenizer,
 ) -> tuple[str, int]:
     # TODO
     all_sub_communities = [
@@ -438,6 +956,8 @@ def _pack_single_community_by_sub_communities(
         all_sub_communities,
         key=lambda x: x["report_string"],
         max_token_size=max_token_size,
+        count_key=lambda x: x.get("report_tokens"),
+        tokenizer=tokenizer,
     )
     sub_fields = ["id", "report", "rating", "importance"]
     sub_communities_describe = list_of_list_to_csv(
@@ -459,7 +979,7 @@ def _pack_single_community_by_sub_communities(
         already_edges.extend([tuple(e) for e in c["edges"]])
     return (
         sub_communities_describe,
-        len(encode_string_by_tiktoken(sub_communities_describe)),
+        tokenizer.count(sub_communities_describe, cache=False),
         set(already_nodes),
         set(already_edges),
     )
@@ -472,14 +992,13 @@ async def _pack_single_community_describe(
     already_reports: dict[str, CommunitySchema] = {},
     global_config: dict = {},
 ) -> str:
+    tokenizer = get_tokenizer(global_config["tiktoken_model_name"])
     nodes_in_order = sorted(community["nodes"])
     edges_in_order = sorted(community["edges"], key=lambda x: x[0] + x[1])
 
-    nodes_data = await asyncio.gather(
-        *[knwoledge_graph_inst.get_node(n) for n in nodes_in_order]
-    )
-    edges_data = await asyncio.gather(
-        *[knwoledge_graph_inst.get_edge(src, tgt) for src, tgt in edges_in_order]
+    nodes_data = await knwoledge_graph_inst.get_nodes_batch(nodes_in_order)
+    edges_data = await knwoledge_graph_inst.get_edges_batch(
+        [(src, tgt) for src, tgt in edges_in_order]
     )
     node_fields = ["id", "entity", "type", "description", "degree"]
     edge_fields = ["id", "source", "target", "description", "rank"]
@@ -495,8 +1014,19 @@ async def _pack_single_community_describe(
         for i, (node_name, node_data) in enumerate(zip(nodes_in_order, nodes_data))
     ]
     nodes_list_data = sorted(nodes_list_data, key=lambda x: x[-1], reverse=True)
+    # rows keep their index into nodes_data/edges_data in the first column
+    def node_tokens(row):
+        return nodes_data[row[0]].get("description_tokens")
+
+    def edge_tokens(row):
+        return edges_data[row[0]].get("description_tokens")
+
     nodes_may_truncate_list_data = truncate_list_by_token_size(
-        nodes_list_data, key=lambda x: x[3], max_token_size=max_token_size // 2
+        nodes_list_data,
+        key=lambda x: x[3],
+        max_token_size=max_token_size // 2,
+        count_key=node_tokens,
+        tokenizer=tokenizer,
     )
     edge_degrees = await knwoledge_graph_inst.edge_degrees_batch(edges_in_order)
     edges_list_data = [
@@ -511,7 +1041,11 @@ async def _pack_single_community_describe(
     ]
     edges_list_data = sorted(edges_list_data, key=lambda x: x[-1], reverse=True)
     edges_may_truncate_list_data = truncate_list_by_token_size(
-        edges_list_data, key=lambda x: x[3], max_token_size=max_token_size // 2
+        edges_list_data,
+        key=lambda x: x[3],
+        max_token_size=max_token_size // 2,
+        count_key=edge_tokens,
+        tokenizer=tokenizer,
     )
 
     truncated = len(nodes_list_data) > len(nodes_may_truncate_list_data) or len(
@@ -532,7 +1066,7 @@ async def _pack_single_community_describe(
         )
         report_describe, report_size, contain_nodes, contain_edges = (
             _pack_single_community_by_sub_communities(
-                community, max_token_size, already_reports
+                community, max_token_size, already_reports, tokenizer
             )
         )
         report_exclude_nodes_list_data = [
@@ -552,11 +1086,15 @@ async def _pack_single_community_describe(
             report_exclude_nodes_list_data + report_include_nodes_list_data,
             key=lambda x: x[3],
             max_token_size=(max_token_size - report_size) // 2,
+            count_key=node_tokens,
+            tokenizer=tokenizer,
         )
         edges_may_truncate_list_data = truncate_list_by_token_size(
             report_exclude_edges_list_data + report_include_edges_list_data,
             key=lambda x: x[3],
             max_token_size=(max_token_size - report_size) // 2,
+            count_key=edge_tokens,
+            tokenizer=tokenizer,
         )
     nodes_describe = list_of_list_to_csv([node_fields] + nodes_may_truncate_list_data)
     edges_describe = list_of_list_to_csv([edge_fields] + edges_may_truncate_list_data)
@@ -608,12 +1146,26 @@ async def generate_community_report(
     ]
 
     community_report_prompt = PROMPTS["community_report"]
+    tokenizer = get_tokenizer(global_config["tiktoken_model_name"])
 
     communities_schema = await knwoledge_graph_inst.community_schema()
     community_keys, community_values = list(communities_schema.keys()), list(
         communities_schema.values()
     )
     already_processed = 0
+    # cluster ids change between clusterings, so stored reports are matched by content
+    stored_reports = await community_report_kv.get_by_ids(
+        await community_report_kv.all_keys()
+    )
+    reusable_reports = {
+        r["fingerprint"]: r["report_json"]
+        for r in stored_reports
+        if r is not None and "fingerprint" in r
+    }
+    member_fingerprints = await _community_member_fingerprints(
+        knwoledge_graph_inst, community_values
+    )
+    reused = 0
 
     async def _form_single_community_report(
         community: SingleCommunitySchema, already_reports: dict[str, CommunitySchema]
@@ -652,34 +1204,110 @@ async def generate_community_report(
                 if v["level"] == level
             ]
         )
+        # sub-communities are a level below and already fingerprinted, so a
+        # change in any of them also invalidates the report of its ancestors
+        this_level_fingerprints = [
+            _community_fingerprint(c, member_fingerprints, community_datas)
+            for c in this_level_community_values
+        ]
+
+        async def _reuse_or_form_report(community, fingerprint):
+            nonlocal reused
+            if fingerprint in reusable_reports:
+                reused += 1
+                return reusable_reports[fingerprint]
+            return await _form_single_community_report(community, community_datas)
+
         this_level_communities_reports = await asyncio.gather(
             *[
-                _form_single_community_report(c, community_datas)
-                for c in this_level_community_values
+                _reuse_or_form_report(c, f)
+                for c, f in zip(this_level_community_values, this_level_fingerprints)
             ]
         )
+        this_level_report_strings = [
+            _community_report_json_to_str(r) for r in this_level_communities_reports
+        ]
+        this_level_report_tokens = tokenizer.count_batch(this_level_report_strings)
         community_datas.update(
             {
                 k: {
-                    "report_string": _community_report_json_to_str(r),
+                    "report_string": s,
+                    "report_tokens": t,
                     "report_json": r,
                     **v,
+                    "fingerprint": f,
                 }
-                for k, r, v in zip(
+                for k, s, t, r, v, f in zip(
                     this_level_community_keys,
+                    this_level_report_strings,
+                    this_level_report_tokens,
                     this_level_communities_reports,
                     this_level_community_values,
+                    this_level_fingerprints,
                 )
             }
         )
     print()  # clear the progress bar
+    logger.info(
+        f"Reused {reused}/{len(community_datas)} community reports, generated {already_processed}"
+    )
+    # replace only once every report is ready, a failure keeps the old ones
+    await community_report_kv.drop()
     await community_report_kv.upsert(community_datas)
 
 
+async def _community_member_fingerprints(
+    knwoledge_graph_inst: BaseGraphStorage,
+    communities: list[SingleCommunitySchema],
+) -> dict:
+    """Fingerprint of every node and edge in `communities`, from their graph data"""
+    node_ids = list({n for c in communities for n in c["nodes"]})
+    edge_ids = list({tuple(e) for c in communities for e in c["edges"]})
+    node_datas = await knwoledge_graph_inst.get_nodes_batch(node_ids)
+    edge_datas = await knwoledge_graph_inst.get_edges_batch(edge_ids)
+    fingerprints = {}
+    for node_id, node_data in zip(node_ids, node_datas):
+        node_data = node_data or {}
+        fingerprints[node_id] = xxhash.xxh3_64_hexdigest(
+            json.dumps(
+                [node_id, node_data.get("entity_type"), node_data.get("description")]
+            ).encode()
+        )
+    for edge_id, edge_data in zip(edge_ids, edge_datas):
+        edge_data = edge_data or {}
+        fingerprints[edge_id] = xxhash.xxh3_64_hexdigest(
+            json.dumps(
+                [list(edge_id), edge_data.get("weight"), edge_data.get("description")]
+            ).encode()
+        )
+    return fingerprints
+
+
+def _community_fingerprint(
+    community: SingleCommunitySchema,
+    member_fingerprints: dict,
+    community_datas: dict[str, CommunitySchema],
+) -> str:
+    return xxhash.xxh3_128_hexdigest(
+        json.dumps(
+            [
+                sorted(member_fingerprints[n] for n in community["nodes"]),
+                sorted(member_fingerprints[tuple(e)] for e in community["edges"]),
+                sorted(
+                    community_datas[c]["fingerprint"]
+                    for c in community["sub_communities"]
+                    if c in community_datas
+                ),
+            ]
+        ).encode()
+    )
+
+
 async def _find_most_related_community_from_entities(
     node_datas: list[dict],
     query_param: QueryParam,
     community_reports: BaseKVStorage[CommunitySchema],
+    tokenizer: Tokenizer,
 ):
     related_communities = []
     for node_d in node_datas:
@@ -716,6 +1344,8 @@ async def _find_most_related_community_from_entities(
         sorted_community_datas,
         key=lambda x: x["report_string"],
         max_token_size=query_param.local_max_token_for_community_report,
+        count_key=lambda x: x.get("report_tokens"),
+        tokenizer=tokenizer,
     )
     if query_param.local_community_single_one:
         use_community_reports = use_community_reports[:1]
@@ -727,6 +1357,7 @@ async def _find_most_related_text_unit_from_entities(
     query_param: QueryParam,
     text_chunks_db: BaseKVStorage[TextChunkSchema],
     knowledge_graph_inst: BaseGraphStorage,
+    tokenizer: Tokenizer,
 ):
     text_units = [
         split_string_by_multi_markers(dp["source_id"], [GRAPH_FIELD_SEP])
@@ -758,10 +1389,14 @@ async def _find_most_related_text_unit_from_entities(
                 ):
                     relation_counts += 1
             all_text_units_lookup[c_id] = {
-                "data": await text_chunks_db.get_by_id(c_id),
                 "order": index,
                 "relation_counts": relation_counts,
             }
+    all_text_units_data = await text_chunks_db.get_by_ids(
+        list(all_text_units_lookup.keys())
+    )
+    for v, data in zip(all_text_units_lookup.values(), all_text_units_data):
+        v["data"] = data
     if any([v is None for v in all_text_units_lookup.values()]):
         logger.warning("Text chunks are missing, maybe the storage is damaged")
     all_text_units = [
@@ -774,6 +1409,8 @@ async def _find_most_related_text_unit_from_entities(
         all_text_units,
         key=lambda x: x["data"]["content"],
         max_token_size=query_param.local_max_token_for_text_unit,
+        count_key=lambda x: x["data"].get("tokens"),
+        tokenizer=tokenizer,
     )
     all_text_units: list[TextChunkSchema] = [t["data"] for t in all_text_units]
     return all_text_units
@@ -783,6 +1420,7 @@ async def _find_most_related_edges_from_entities(
     node_datas: list[dict],
     query_param: QueryParam,
     knowledge_graph_inst: BaseGraphStorage,
+    tokenizer: Tokenizer,
 ):
     all_related_edges = await knowledge_graph_inst.get_nodes_edges_batch([dp["entity_name"] for dp in node_datas])
     
@@ -810,6 +1448,8 @@ async def _find_most_related_edges_from_entities(
         all_edges_data,
         key=lambda x: x["description"],
         max_token_size=query_param.local_max_token_for_local_context,
+        count_key=lambda x: x.get("description_tokens"),
+        tokenizer=tokenizer,
     )
     return all_edges_data
 
@@ -821,6 +1461,7 @@ async def _build_local_query_context(
     community_reports: BaseKVStorage[CommunitySchema],
     text_chunks_db: BaseKVStorage[TextChunkSchema],
     query_param: QueryParam,
+    tokenizer: Tokenizer,
 ):
     results = await entities_vdb.query(query, top_k=query_param.top_k)
     if not len(results):
@@ -835,13 +1476,13 @@ async def _build_local_query_context(
         if n is not None
     ]
     use_communities = await _find_most_related_community_from_entities(
-        node_datas, query_param, community_reports
+        node_datas, query_param, community_reports, tokenizer
     )
     use_text_units = await _find_most_related_text_unit_from_entities(
-        node_datas, query_param, text_chunks_db, knowledge_graph_inst
+        node_datas, query_param, text_chunks_db, knowledge_graph_inst, tokenizer
     )
     use_relations = await _find_most_related_edges_from_entities(
-        node_datas, query_param, knowledge_graph_inst
+        node_datas, query_param, knowledge_graph_inst, tokenizer
     )
     logger.info(
         f"Using {len(node_datas)} entites, {len(use_communities)} communities, {len(use_relations)} relations, {len(use_text_units)} text units"
@@ -921,6 +1562,7 @@ async def local_query(
         community_reports,
         text_chunks_db,
         query_param,
+        get_tokenizer(global_config["tiktoken_model_name"]),
     )
     if query_param.only_need_context:
         return context
@@ -945,12 +1587,15 @@ async def _map_global_communities(
 ):
     use_string_json_convert_func = global_config["convert_response_to_json_func"]
     use_model_func = global_config["best_model_func"]
+    tokenizer = get_tokenizer(global_config["tiktoken_model_name"])
     community_groups = []
     while len(communities_data):
         this_group = truncate_list_by_token_size(
             communities_data,
             key=lambda x: x["report_string"],
             max_token_size=query_param.global_max_token_for_community_report,
+            count_key=lambda x: x.get("report_tokens"),
+            tokenizer=tokenizer,
         )
         community_groups.append(this_group)
         communities_data = communities_data[len(this_group) :]
@@ -1048,6 +1693,7 @@ async def global_query(
         final_support_points,
         key=lambda x: x["answer"],
         max_token_size=query_param.global_max_token_for_community_report,
+        tokenizer=get_tokenizer(global_config["tiktoken_model_name"]),
     )
     points_context = []
     for dp in final_support_points:
@@ -1088,6 +1734,8 @@ async def naive_query(
         chunks,
         key=lambda x: x["content"],
         max_token_size=query_param.naive_max_token_for_text_unit,
+        count_key=lambda x: x.get("tokens"),
+        tokenizer=get_tokenizer(global_config["tiktoken_model_name"]),
     )
     logger.info(f"Truncate {len(chunks)} to {len(maybe_trun_chunks)} chunks")
     section = "--New Chunk--\n".join([c["content"] for c in maybe_trun_chunks])
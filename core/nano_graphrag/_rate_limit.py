@@ -0,0 +1,282 @@
+"""Adaptive request/token budgets of LLM and embedding calls, shared per model.
+
+Budgets are configured once per process with `configure_rate_limits`, e.g.
+`{"gpt-4o-mini": {"rpm": 500, "tpm": 200000}}`, because provider limits apply
+to the account and not to a single GraphRAG instance.
+"""
+import asyncio
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+
+from ._utils import AsyncCallLimiter, get_tokenizer, logger
+
+DEFAULT_RETRY_AFTER = 1.0
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+class RateLimitedError(Exception):
+    """429 response of a client that is not the openai SDK"""
+
+    status_code = 429
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    # x-ratelimit-reset-* headers look like "1m30s", "6.5s" or "20ms"
+    try:
+        return float(value)
+    except ValueError:
+        parts = _DURATION_PART.findall(value)
+        if not parts:
+            return None
+        return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def retry_after_from_headers(headers) -> float:
+    """Delay the server asks for before the next request, in seconds"""
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    if headers.get("retry-after"):
+        retry_after = _parse_duration(headers["retry-after"])
+        if retry_after is not None:
+            return retry_after
+    resets = [
+        _parse_duration(headers[name])
+        for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")
+        if headers.get(name)
+    ]
+    resets = [r for r in resets if r is not None]
+    return max(resets) if resets else DEFAULT_RETRY_AFTER
+
+
+def parse_retry_after(exc: Exception) -> Optional[float]:
+    """Retry delay of a rate-limit error, None if `exc` isn't one"""
+    if isinstance(exc, RateLimitedError):
+        return exc.retry_after or DEFAULT_RETRY_AFTER
+    if getattr(exc, "status_code", None) != 429:
+        return None
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    return retry_after_from_headers(headers) if headers else DEFAULT_RETRY_AFTER
+
+
+def estimate_tokens(texts: list[str], tiktoken_model_name: str = "gpt-4o") -> int:
+    return sum(
+        get_tokenizer(tiktoken_model_name).count_batch(
+            [t for t in texts if t], cache=False
+        )
+    )
+
+
+def estimate_message_tokens(
+    messages: list[dict], tiktoken_model_name: str = "gpt-4o"
+) -> int:
+    # ~4 tokens of chat formatting per message
+    return estimate_tokens(
+        [m["content"] for m in messages], tiktoken_model_name
+    ) + 4 * len(messages)
+
+
+class TokenBucket:
+    """Budget refilled continuously at `per_minute` units per minute.
+
+    Reservations are taken immediately, possibly driving the level negative,
+    and the caller sleeps until the debt is paid back, so requests are served
+    in the order they reserved.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Take `amount` units, return the seconds to wait before using them"""
+        self._refill(time.monotonic())
+        self.level -= min(amount, self.capacity)
+        return max(-self.level / self.rate, 0.0)
+
+    def adjust(self, amount: float):
+        """Give back (positive) or charge (negative) units after the fact"""
+        self._refill(time.monotonic())
+        self.level = min(self.capacity, self.level + amount)
+
+    def exhaust(self):
+        self._refill(time.monotonic())
+        self.level = min(self.level, 0.0)
+
+
+@dataclass
+class RateLimiter:
+    """Dispatch calls of one model within its RPM/TPM budget.
+
+    Concurrency is adjusted additive-increase/multiplicative-decrease: halved
+    on every 429, with new requests held back for the server's retry hint, and
+    raised by one after a window of successful calls that didn't have to wait
+    for budget.
+    """
+
+    model: str
+    rpm: Optional[int] = None
+    tpm: Optional[int] = None
+    max_concurrency: int = 16
+    min_concurrency: int = 1
+    initial_concurrency: Optional[int] = None
+    max_retries: int = 5
+    requests: int = 0
+    rate_limited: int = 0
+    estimated_tokens: int = 0
+    actual_tokens: int = 0
+    throttle_seconds: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def __post_init__(self):
+        self._request_bucket = TokenBucket(self.rpm) if self.rpm else None
+        self._token_bucket = TokenBucket(self.tpm) if self.tpm else None
+        if self.initial_concurrency is None:
+            # without budgets there is nothing to ramp against, only back off on 429
+            self.initial_concurrency = (
+                max(self.min_concurrency, self.max_concurrency // 4)
+                if self.rpm or self.tpm
+                else self.max_concurrency
+            )
+        self.concurrency = self.initial_concurrency
+        self._slots = AsyncCallLimiter(self.concurrency)
+        self._cooldown_until = 0.0
+        self._window_successes = 0
+        self._window_throttled = False
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model,
+            "concurrency": self.concurrency,
+            "requests": self.requests,
+            "rate_limited": self.rate_limited,
+            "estimated_tokens": self.estimated_tokens,
+            "actual_tokens": self.actual_tokens,
+            "throttle_seconds": self.throttle_seconds,
+            **self._slots.stats(),
+        }
+
+    def _reserve(self, tokens: int) -> float:
+        with self._lock:
+            wait = self._cooldown_until - time.monotonic()
+            if self._request_bucket is not None:
+                wait = max(wait, self._request_bucket.reserve(1))
+            if self._token_bucket is not None:
+                wait = max(wait, self._token_bucket.reserve(tokens))
+            if wait > 0:
+                self._window_throttled = True
+                self.throttle_seconds += wait
+            self.requests += 1
+            self.estimated_tokens += tokens
+            return wait
+
+    def _set_concurrency(self, concurrency: int):
+        self.concurrency = concurrency
+        self._slots.resize(concurrency)
+        self._window_successes = 0
+        self._window_throttled = False
+
+    def _on_success(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        with self._lock:
+            if actual_tokens is not None:
+                self.actual_tokens += actual_tokens
+                if self._token_bucket is not None:
+                    self._token_bucket.adjust(estimated_tokens - actual_tokens)
+            self._window_successes += 1
+            if self._window_successes < self.concurrency:
+                return
+            if not self._window_throttled and self.concurrency < self.max_concurrency:
+                self._set_concurrency(self.concurrency + 1)
+                logger.debug(f"Raised concurrency of {self.model} to {self.concurrency}")
+            else:
+                self._window_successes = 0
+                self._window_throttled = False
+
+    def _on_rate_limited(self, retry_after: float):
+        with self._lock:
+            self.rate_limited += 1
+            self._cooldown_until = max(
+                self._cooldown_until, time.monotonic() + retry_after
+            )
+            for bucket in (self._request_bucket, self._token_bucket):
+                if bucket is not None:
+                    bucket.exhaust()
+            self._set_concurrency(max(self.min_concurrency, self.concurrency // 2))
+        logger.warning(
+            f"Rate limited on {self.model}, retry in {retry_after:.1f}s "
+            f"with concurrency {self.concurrency}"
+        )
+
+    async def call(
+        self,
+        func: Callable[[], Awaitable],
+        estimated_tokens: int = 0,
+        actual_tokens: Optional[Callable[[object], Optional[int]]] = None,
+    ):
+        """Run `func()` once budget allows, retrying on 429 after the server's hint.
+
+        `actual_tokens` maps the result to the tokens it really used, to
+        correct the estimate charged to the TPM budget.
+        """
+        for attempt in range(self.max_retries + 1):
+            await self._slots.acquire()
+            try:
+                wait = self._reserve(estimated_tokens)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                try:
+                    result = await func()
+                except Exception as e:
+                    retry_after = parse_retry_after(e)
+                    if retry_after is None or attempt == self.max_retries:
+                        raise
+                    self._on_rate_limited(retry_after)
+                    continue
+                self._on_success(
+                    estimated_tokens,
+                    actual_tokens(result) if actual_tokens is not None else None,
+                )
+                return result
+            finally:
+                self._slots.release()
+
+
+_rate_limits: dict[str, dict] = {}
+_rate_limiters: dict[str, RateLimiter] = {}
+_registry_lock = threading.Lock()
+
+
+def configure_rate_limits(rate_limits: dict[str, dict]):
+    """Set the budget of each model, as keyword arguments of `RateLimiter`"""
+    with _registry_lock:
+        for model, limits in rate_limits.items():
+            if _rate_limits.get(model) != limits:
+                _rate_limits[model] = dict(limits)
+                # calls in flight finish on the old limiter
+                _rate_limiters.pop(model, None)
+
+
+def get_rate_limiter(model: str) -> RateLimiter:
+    with _registry_lock:
+        limiter = _rate_limiters.get(model)
+        if limiter is None:
+            limiter = RateLimiter(model=model, **_rate_limits.get(model, {}))
+            _rate_limiters[model] = limiter
+        return limiter
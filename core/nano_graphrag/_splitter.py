@@ -1,5 +1,32 @@
+import re
 from typing import List, Optional, Union, Literal
 
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_NAMED_HEADING = re.compile(
+    r"^(abstract|introduction|background|related work|preliminaries|methods?|"
+    r"methodology|approach|experiments?|experimental (setup|results)|evaluation|"
+    r"results|discussion|analysis|conclusions?|limitations|future work|"
+    r"acknowledge?ments?|appendix( [a-z0-9]{1,2}\b.*)?|appendices|"
+    r"supplementary material|references|"
+    r"bibliography|works cited|literature cited)\s*:?$",
+    re.IGNORECASE,
+)
+# "3.2 Training Details", "IV. EXPERIMENTS", "A. Proofs", "## Results"
+_NUMBERED_HEADING = re.compile(
+    r"^(#{1,6}\s+\S.*|(\d+(\.\d+)*\.?|[IVX]+\.|[A-Z]\.)\s+[A-Z][^.!?]*)$"
+)
+_REFERENCES_HEADING = re.compile(
+    r"^(references|bibliography|works cited|literature cited)\s*:?$", re.IGNORECASE
+)
+_APPENDIX_HEADING = re.compile(
+    r"^(appendix|appendices|supplementary)\b", re.IGNORECASE
+)
+_DISPLAY_MATH = re.compile(
+    r"^\s*(\$\$|\\\[|\\begin\{(equation|align|gather|multline|eqnarray))"
+)
+_EQUATION_NUMBER = re.compile(r"=.*\(\d+(\.\d+)?\)\s*$", re.DOTALL)
+
+
 class SeparatorSplitter:
     def __init__(
         self,
@@ -14,32 +41,66 @@ class SeparatorSplitter:
         self._chunk_size = chunk_size
         self._chunk_overlap = chunk_overlap
         self._length_function = length_function
+        self._trie = self._build_trie()
 
     def split_tokens(self, tokens: List[int]) -> List[List[int]]:
         splits = self._split_tokens_with_separators(tokens)
         return self._merge_splits(splits)
 
+    def _build_trie(self) -> dict:
+        # token -> [children, index of the first separator ending here or None]
+        trie = {}
+        for index, separator in enumerate(self._separators):
+            if not separator:
+                continue
+            children, node = trie, None
+            for token in separator:
+                node = children.setdefault(token, [{}, None])
+                children = node[0]
+            if node[1] is None:
+                node[1] = index
+        return trie
+
     def _split_tokens_with_separators(self, tokens: List[int]) -> List[List[int]]:
+        # one pass over the tokens, walking a trie of the separators at every
+        # position; the separator listed first wins among those matching there
         splits = []
         current_split = []
-        i = 0
-        while i < len(tokens):
-            separator_found = False
-            for separator in self._separators:
-                if tokens[i:i+len(separator)] == separator:
-                    if self._keep_separator in [True, "end"]:
-                        current_split.extend(separator)
-                    if current_split:
-                        splits.append(current_split)
-                        current_split = []
-                    if self._keep_separator == "start":
-                        current_split.extend(separator)
-                    i += len(separator)
-                    separator_found = True
+        root = self._trie
+        keep_end = self._keep_separator in [True, "end"]
+        keep_start = self._keep_separator == "start"
+        num_tokens = len(tokens)
+        i = start = 0
+        while i < num_tokens:
+            node = root.get(tokens[i])
+            if node is None:
+                i += 1
+                continue
+            best = None
+            j = i + 1
+            while True:
+                if node[1] is not None and (best is None or node[1] < best):
+                    best = node[1]
+                if j >= num_tokens:
                     break
-            if not separator_found:
-                current_split.append(tokens[i])
+                node = node[0].get(tokens[j])
+                if node is None:
+                    break
+                j += 1
+            if best is None:
                 i += 1
+                continue
+            separator = self._separators[best]
+            current_split.extend(tokens[start:i])
+            if keep_end:
+                current_split.extend(separator)
+            if current_split:
+                splits.append(current_split)
+                current_split = []
+            if keep_start:
+                current_split.extend(separator)
+            i = start = i + len(separator)
+        current_split.extend(tokens[start:])
         if current_split:
             splits.append(current_split)
         return [s for s in splits if s]
@@ -92,3 +153,64 @@ class SeparatorSplitter:
                 result.append(new_chunk)
         return result
 
+
+
+def _heading_title(line: str) -> Optional[str]:
+    """Section title of `line` without numbering, None if it isn't a heading"""
+    line = line.strip()
+    if not line or len(line) > 80 or len(line.split()) > 10:
+        return None
+    if _NAMED_HEADING.match(line):
+        return line
+    if _NUMBERED_HEADING.match(line):
+        # drop the numbering or markdown marker
+        return line.split(None, 1)[1]
+    return None
+
+
+def _is_equation(block: str) -> bool:
+    return bool(_DISPLAY_MATH.match(block)) or (
+        len(block) < 300 and bool(_EQUATION_NUMBER.search(block))
+    )
+
+
+def split_paper_sections(
+    text: str, drop_references: bool = True
+) -> List[tuple[Optional[str], List[str]]]:
+    """Split a paper into (heading, paragraphs) sections.
+
+    Headings are recognized on their own line, also inside a paragraph as
+    in text extracted from PDFs. Display equations stay with the paragraph
+    before them. With `drop_references` the reference list is left out, up
+    to an appendix heading if any.
+    """
+    sections = [(None, [])]
+    in_references = False
+    for block in _PARAGRAPH_BREAK.split(text):
+        lines = []
+
+        def _end_paragraph():
+            paragraph = "\n".join(lines).strip()
+            lines.clear()
+            if not paragraph or in_references:
+                return
+            paragraphs = sections[-1][1]
+            if paragraphs and _is_equation(paragraph):
+                paragraphs[-1] += "\n" + paragraph
+            else:
+                paragraphs.append(paragraph)
+
+        for line in block.split("\n"):
+            title = _heading_title(line)
+            if title is None:
+                lines.append(line)
+                continue
+            _end_paragraph()
+            if _REFERENCES_HEADING.match(title):
+                in_references = drop_references
+            elif _APPENDIX_HEADING.match(title):
+                in_references = False
+            if not in_references:
+                sections.append((line.strip(), []))
+        _end_paragraph()
+    return [(h, p) for h, p in sections if h is not None or p]
@@ -1,3 +1,7 @@
 from .gdb_networkx import NetworkXStorage
 from .vdb_hnswlib import HNSWVectorStorage
+from .vdb_numpy import NumpyVectorStorage
 from .kv_json import JsonKVStorage
+from .kv_jsonl import JsonlKVStorage
+from .kv_sqlite import SqliteKVStorage
+from .kv_llm_cache import LLMResponseCache
@@ -0,0 +1,84 @@
+"""Single-file container of aligned numpy arrays, shared by the binary storages.
+
+Layout: magic, little-endian uint64 header length, JSON header describing
+every array (dtype, shape, offset), then the raw arrays aligned to
+ARRAY_FILE_ALIGN bytes so they can be memory-mapped.
+"""
+import json
+import os
+
+import numpy as np
+
+ARRAY_FILE_ALIGN = 64
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ARRAY_FILE_ALIGN) * ARRAY_FILE_ALIGN
+
+
+def encode_string_pool(strings: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    return encode_bytes_pool([s.encode("utf-8") for s in strings])
+
+
+def encode_bytes_pool(encoded: list[bytes]) -> tuple[np.ndarray, np.ndarray]:
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return blob, offsets
+
+
+def decode_string_pool(blob: np.ndarray, offsets: np.ndarray) -> list[str]:
+    raw = blob.tobytes()
+    bounds = offsets.tolist()
+    return [raw[bounds[i] : bounds[i + 1]].decode("utf-8") for i in range(len(bounds) - 1)]
+
+
+def write_array_file(file_name, magic: bytes, header: dict, arrays: dict[str, np.ndarray]):
+    header = dict(header, arrays={})
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    offset = 0
+    for name, array in arrays.items():
+        offset = _align(offset)
+        header["arrays"][name] = {
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "offset": offset,
+        }
+        offset += array.nbytes
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = _align(len(magic) + 8 + len(header_bytes))
+
+    # write aside and swap, a memory-mapped copy of the old file may be in use
+    tmp_file_name = file_name + ".tmp"
+    with open(tmp_file_name, "wb") as f:
+        f.write(magic)
+        f.write(len(header_bytes).to_bytes(8, "little"))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.seek(data_start + header["arrays"][name]["offset"])
+            f.write(array.tobytes())
+    os.replace(tmp_file_name, file_name)
+
+
+def read_array_file(
+    file_name, magic: bytes, mmap: bool = True
+) -> tuple[dict, dict[str, np.ndarray]]:
+    with open(file_name, "rb") as f:
+        if f.read(len(magic)) != magic:
+            raise ValueError(f"{file_name} is not a {magic.decode()} file")
+        header_size = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(header_size).decode("utf-8"))
+    data_start = _align(len(magic) + 8 + header_size)
+
+    raw = (
+        np.memmap(file_name, dtype=np.uint8, mode="r")
+        if mmap
+        else np.fromfile(file_name, dtype=np.uint8)
+    )
+    arrays = {}
+    for name, meta in header["arrays"].items():
+        dtype = np.dtype(meta["dtype"])
+        count = int(np.prod(meta["shape"]))
+        start = data_start + meta["offset"]
+        arrays[name] = raw[start : start + count * dtype.itemsize].view(dtype)
+    return header, arrays
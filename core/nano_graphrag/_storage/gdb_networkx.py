@@ -1,20 +1,170 @@
+import glob
 import html
 import json
 import os
+import re
 from collections import defaultdict
 from dataclasses import dataclass
 from typing import Any, Union, cast, List
 import networkx as nx
 import numpy as np
-import asyncio
 
 from .._utils import logger
+from ._arrays import (
+    decode_string_pool,
+    encode_string_pool,
+    read_array_file,
+    write_array_file,
+)
 from ..base import (
     BaseGraphStorage,
     SingleCommunitySchema,
 )
 from ..prompt import GRAPH_FIELD_SEP
 
+GRAPH_BINARY_MAGIC = b"NGRAPH01"
+
+
+def _encode_attribute_columns(
+    rows: list[dict], pool: dict[str, int], arrays: dict, prefix: str
+) -> list[dict]:
+    """Store every attribute key as one column.
+
+    Columns whose values are all strings become indices into the string pool,
+    all-numeric columns become float64 with NaN for missing values, anything
+    else is JSON-encoded into the pool.
+    """
+    keys = sorted(set().union(*[r.keys() for r in rows])) if rows else []
+    columns = []
+    for key in keys:
+        values = [r.get(key) for r in rows]
+        present = [v for v in values if v is not None]
+        if all(isinstance(v, str) for v in present):
+            kind = "str"
+            column = np.fromiter(
+                (-1 if v is None else pool.setdefault(v, len(pool)) for v in values),
+                dtype=np.int64,
+                count=len(values),
+            )
+        elif all(
+            isinstance(v, (int, float, np.number)) and not isinstance(v, bool)
+            for v in present
+        ):
+            kind = (
+                "int"
+                if all(isinstance(v, (int, np.integer)) for v in present)
+                else "float"
+            )
+            column = np.array(
+                [np.nan if v is None else float(v) for v in values], dtype=np.float64
+            )
+        else:
+            kind = "json"
+            column = np.fromiter(
+                (
+                    -1 if v is None else pool.setdefault(json.dumps(v), len(pool))
+                    for v in values
+                ),
+                dtype=np.int64,
+                count=len(values),
+            )
+        array_name = f"{prefix}_{len(columns)}"
+        arrays[array_name] = column
+        columns.append({"key": key, "kind": kind, "array": array_name})
+    return columns
+
+
+def _decode_attribute_columns(
+    columns: list[dict], arrays: dict, strings: list[str], size: int
+) -> list[dict]:
+    rows = [{} for _ in range(size)]
+    for column in columns:
+        key, kind = column["key"], column["kind"]
+        values = arrays[column["array"]].tolist()
+        for row, v in zip(rows, values):
+            if kind == "str":
+                if v >= 0:
+                    row[key] = strings[v]
+            elif kind == "json":
+                if v >= 0:
+                    row[key] = json.loads(strings[v])
+            elif v == v:  # skip NaN, i.e. missing
+                row[key] = int(v) if kind == "int" else v
+    return rows
+
+
+def write_graph_binary(graph: nx.Graph, file_name):
+    """Write `graph` as a node table + CSR adjacency + string pool snapshot"""
+    node_names = list(graph.nodes())
+    node_index = {n: i for i, n in enumerate(node_names)}
+    pool: dict[str, int] = {}
+    arrays: dict[str, np.ndarray] = {}
+    arrays["node_names"] = np.fromiter(
+        (pool.setdefault(str(n), len(pool)) for n in node_names),
+        dtype=np.int64,
+        count=len(node_names),
+    )
+    node_columns = _encode_attribute_columns(
+        [graph.nodes[n] for n in node_names], pool, arrays, "node_attr"
+    )
+
+    # every undirected edge is kept once, under its lower-index endpoint
+    edges = []
+    for u, v, data in graph.edges(data=True):
+        ui, vi = node_index[u], node_index[v]
+        if not graph.is_directed() and ui > vi:
+            ui, vi = vi, ui
+        edges.append((ui, vi, data))
+    edges.sort(key=lambda e: (e[0], e[1]))
+    indptr = np.zeros(len(node_names) + 1, dtype=np.int64)
+    np.add.at(indptr, np.array([e[0] + 1 for e in edges], dtype=np.int64), 1)
+    arrays["indptr"] = np.cumsum(indptr)
+    arrays["indices"] = np.array([e[1] for e in edges], dtype=np.int64)
+    edge_columns = _encode_attribute_columns(
+        [e[2] for e in edges], pool, arrays, "edge_attr"
+    )
+
+    strings = [None] * len(pool)
+    for s, i in pool.items():
+        strings[i] = s
+    arrays["string_blob"], arrays["string_offsets"] = encode_string_pool(strings)
+
+    header = {
+        "directed": graph.is_directed(),
+        "graph": dict(graph.graph),
+        "num_nodes": len(node_names),
+        "num_edges": len(edges),
+        "node_columns": node_columns,
+        "edge_columns": edge_columns,
+    }
+    write_array_file(file_name, GRAPH_BINARY_MAGIC, header, arrays)
+
+
+def read_graph_binary(file_name, mmap: bool = True) -> nx.Graph:
+    header, arrays = read_array_file(file_name, GRAPH_BINARY_MAGIC, mmap=mmap)
+    strings = decode_string_pool(arrays["string_blob"], arrays["string_offsets"])
+    num_nodes, num_edges = header["num_nodes"], header["num_edges"]
+    node_names = [strings[i] for i in arrays["node_names"].tolist()]
+    node_rows = _decode_attribute_columns(
+        header["node_columns"], arrays, strings, num_nodes
+    )
+    edge_rows = _decode_attribute_columns(
+        header["edge_columns"], arrays, strings, num_edges
+    )
+    sources = np.repeat(
+        np.arange(num_nodes, dtype=np.int64), np.diff(arrays["indptr"])
+    ).tolist()
+    targets = arrays["indices"].tolist()
+
+    graph = nx.DiGraph() if header["directed"] else nx.Graph()
+    graph.graph.update(header.get("graph", {}))
+    graph.add_nodes_from(zip(node_names, node_rows))
+    graph.add_edges_from(
+        (node_names[u], node_names[v], data)
+        for u, v, data in zip(sources, targets, edge_rows)
+    )
+    return graph
+
 
 @dataclass
 class NetworkXStorage(BaseGraphStorage):
@@ -31,6 +181,19 @@ class NetworkXStorage(BaseGraphStorage):
         )
         nx.write_graphml(graph, file_name)
 
+    @staticmethod
+    def load_nx_graph_binary(file_name) -> nx.Graph:
+        if os.path.exists(file_name):
+            return read_graph_binary(file_name)
+        return None
+
+    @staticmethod
+    def write_nx_graph_binary(graph: nx.Graph, file_name):
+        logger.info(
+            f"Writing graph with {graph.number_of_nodes()} nodes, {graph.number_of_edges()} edges"
+        )
+        write_graph_binary(graph, file_name)
+
     @staticmethod
     def stable_largest_connected_component(graph: nx.Graph) -> nx.Graph:
         """Refer to https://github.com/microsoft/graphrag/index/graph/utils/stable_lcc.py
@@ -81,12 +244,36 @@ class NetworkXStorage(BaseGraphStorage):
         self._graphml_xml_file = os.path.join(
             self.global_config["working_dir"], f"graph_{self.namespace}.graphml"
         )
-        preloaded_graph = NetworkXStorage.load_nx_graph(self._graphml_xml_file)
+        self._binary_file = os.path.join(
+            self.global_config["working_dir"], f"graph_{self.namespace}.bin"
+        )
+        graph_params = self.global_config.get("graph_storage_cls_kwargs", {})
+        # "binary" snapshots, or "graphml" to keep writing the XML file
+        self._storage_format = graph_params.get("format", "binary")
+        if self._storage_format not in ("binary", "graphml"):
+            raise ValueError(f"Graph storage format {self._storage_format} not supported")
+        # binary format only: number of delta segments kept before a full snapshot
+        self._max_delta_segments = graph_params.get("max_delta_segments", 16)
+        self._dirty_nodes: set[str] = set()
+        self._dirty_edges: set[tuple[str, str]] = set()
+
+        loaded_file = self._binary_file
+        preloaded_graph = None
+        if self._storage_format == "binary":
+            preloaded_graph = NetworkXStorage.load_nx_graph_binary(self._binary_file)
+        if preloaded_graph is None:
+            loaded_file = self._graphml_xml_file
+            preloaded_graph = NetworkXStorage.load_nx_graph(self._graphml_xml_file)
         if preloaded_graph is not None:
             logger.info(
-                f"Loaded graph from {self._graphml_xml_file} with {preloaded_graph.number_of_nodes()} nodes, {preloaded_graph.number_of_edges()} edges"
+                f"Loaded graph from {loaded_file} with {preloaded_graph.number_of_nodes()} nodes, {preloaded_graph.number_of_edges()} edges"
             )
         self._graph = preloaded_graph or nx.Graph()
+        # the snapshot records the last delta segment already folded into it
+        self._delta_seq = int(self._graph.graph.get("delta_seq", 0))
+        self._delta_segments = []
+        if self._storage_format == "binary":
+            self._apply_delta_segments()
         self._clustering_algorithms = {
             "leiden": self._leiden_clustering,
         }
@@ -94,27 +281,130 @@ class NetworkXStorage(BaseGraphStorage):
             "node2vec": self._node2vec_embed,
         }
 
+    def _list_delta_segments(self) -> list[tuple[int, str]]:
+        pattern = re.compile(r"\.delta\.(\d+)\.bin$")
+        segments = []
+        for file_name in glob.glob(
+            os.path.join(
+                self.global_config["working_dir"], f"graph_{self.namespace}.delta.*.bin"
+            )
+        ):
+            match = pattern.search(file_name)
+            if match is not None:
+                segments.append((int(match.group(1)), file_name))
+        return sorted(segments)
+
+    def _apply_delta_segments(self):
+        for seq, file_name in self._list_delta_segments():
+            if seq <= self._delta_seq:
+                # already folded into the snapshot, left over by an interrupted compaction
+                continue
+            delta = read_graph_binary(file_name)
+            for node_id, node_data in delta.nodes(data=True):
+                if self._graph.has_node(node_id):
+                    self._graph.nodes[node_id].clear()
+                self._graph.add_node(node_id, **node_data)
+            for src_id, tgt_id, edge_data in delta.edges(data=True):
+                if self._graph.has_edge(src_id, tgt_id):
+                    self._graph.edges[src_id, tgt_id].clear()
+                self._graph.add_edge(src_id, tgt_id, **edge_data)
+            self._delta_seq = seq
+            self._delta_segments.append(file_name)
+        if self._delta_segments:
+            logger.info(
+                f"Applied {len(self._delta_segments)} delta segments to graph {self.namespace}"
+            )
+
+    def _write_delta_segment(self):
+        delta = nx.Graph()
+        for node_id in self._dirty_nodes:
+            if self._graph.has_node(node_id):
+                delta.add_node(node_id, **self._graph.nodes[node_id])
+        for src_id, tgt_id in self._dirty_edges:
+            if not self._graph.has_edge(src_id, tgt_id):
+                continue
+            for node_id in (src_id, tgt_id):
+                if not delta.has_node(node_id):
+                    delta.add_node(node_id, **self._graph.nodes[node_id])
+            delta.add_edge(src_id, tgt_id, **self._graph.edges[src_id, tgt_id])
+        self._delta_seq += 1
+        file_name = os.path.join(
+            self.global_config["working_dir"],
+            f"graph_{self.namespace}.delta.{self._delta_seq:08d}.bin",
+        )
+        logger.info(
+            f"Writing graph delta with {delta.number_of_nodes()} nodes, {delta.number_of_edges()} edges"
+        )
+        write_graph_binary(delta, file_name)
+        self._delta_segments.append(file_name)
+
+    def _write_snapshot(self):
+        self._graph.graph["delta_seq"] = self._delta_seq
+        NetworkXStorage.write_nx_graph_binary(self._graph, self._binary_file)
+        for file_name in self._delta_segments:
+            os.remove(file_name)
+        self._delta_segments = []
+
     async def index_done_callback(self):
-        NetworkXStorage.write_nx_graph(self._graph, self._graphml_xml_file)
+        if self._storage_format == "graphml":
+            NetworkXStorage.write_nx_graph(self._graph, self._graphml_xml_file)
+            return
+        if not self._dirty_nodes and not self._dirty_edges:
+            return
+        if (
+            not os.path.exists(self._binary_file)
+            or len(self._delta_segments) >= self._max_delta_segments
+            or len(self._dirty_nodes) * 2 > self._graph.number_of_nodes()
+        ):
+            self._write_snapshot()
+        else:
+            self._write_delta_segment()
+        self._dirty_nodes = set()
+        self._dirty_edges = set()
+
+    async def compact(self):
+        """Fold all delta segments into a single snapshot"""
+        if self._storage_format == "binary":
+            self._write_snapshot()
+            self._dirty_nodes = set()
+            self._dirty_edges = set()
+
+    def export_graphml(self, file_name: str = None):
+        """Write the current graph as GraphML, e.g. for Gephi or other tools"""
+        NetworkXStorage.write_nx_graph(self._graph, file_name or self._graphml_xml_file)
 
     async def has_node(self, node_id: str) -> bool:
         return self._graph.has_node(node_id)
 
+    async def has_nodes_batch(self, node_ids: list[str]) -> list[bool]:
+        graph = self._graph
+        return [node_id in graph for node_id in node_ids]
+
     async def has_edge(self, source_node_id: str, target_node_id: str) -> bool:
         return self._graph.has_edge(source_node_id, target_node_id)
 
+    async def has_edges_batch(self, edge_pairs: list[tuple[str, str]]) -> list[bool]:
+        has_edge = self._graph.has_edge
+        return [has_edge(src_id, tgt_id) for src_id, tgt_id in edge_pairs]
+
     async def get_node(self, node_id: str) -> Union[dict, None]:
         return self._graph.nodes.get(node_id)
-    
-    async def get_nodes_batch(self, node_ids: list[str]) -> dict[str, Union[dict, None]]:
-        return await asyncio.gather(*[self.get_node(node_id) for node_id in node_ids])
+
+    async def get_nodes_batch(self, node_ids: list[str]) -> list[Union[dict, None]]:
+        nodes = self._graph.nodes
+        return [nodes.get(node_id) for node_id in node_ids]
 
     async def node_degree(self, node_id: str) -> int:
         # [numberchiffre]: node_id not part of graph returns `DegreeView({})` instead of 0
         return self._graph.degree(node_id) if self._graph.has_node(node_id) else 0
 
-    async def node_degrees_batch(self, node_ids: List[str]) -> List[str]:
-        return await asyncio.gather(*[self.node_degree(node_id) for node_id in node_ids])
+    def _degrees_of(self, node_ids) -> dict[str, int]:
+        graph = self._graph
+        return dict(graph.degree([n for n in set(node_ids) if n in graph]))
+
+    async def node_degrees_batch(self, node_ids: List[str]) -> List[int]:
+        degrees = self._degrees_of(node_ids)
+        return [degrees.get(node_id, 0) for node_id in node_ids]
 
     async def edge_degree(self, src_id: str, tgt_id: str) -> int:
         return (self._graph.degree(src_id) if self._graph.has_node(src_id) else 0) + (
@@ -122,7 +412,11 @@ class NetworkXStorage(BaseGraphStorage):
         )
 
     async def edge_degrees_batch(self, edge_pairs: list[tuple[str, str]]) -> list[int]:
-        return await asyncio.gather(*[self.edge_degree(src_id, tgt_id) for src_id, tgt_id in edge_pairs])
+        degrees = self._degrees_of([n for pair in edge_pairs for n in pair])
+        return [
+            degrees.get(src_id, 0) + degrees.get(tgt_id, 0)
+            for src_id, tgt_id in edge_pairs
+        ]
 
     async def get_edge(
         self, source_node_id: str, target_node_id: str
@@ -132,7 +426,8 @@ class NetworkXStorage(BaseGraphStorage):
     async def get_edges_batch(
         self, edge_pairs: list[tuple[str, str]]
     ) -> list[Union[dict, None]]:
-        return await asyncio.gather(*[self.get_edge(source_node_id, target_node_id) for source_node_id, target_node_id in edge_pairs])
+        edges = self._graph.edges
+        return [edges.get(edge_pair) for edge_pair in edge_pairs]
 
     async def get_node_edges(self, source_node_id: str):
         if self._graph.has_node(source_node_id):
@@ -142,26 +437,35 @@ class NetworkXStorage(BaseGraphStorage):
     async def get_nodes_edges_batch(
         self, node_ids: list[str]
     ) -> list[list[tuple[str, str]]]:
-        return await asyncio.gather(*[self.get_node_edges(node_id) for node_id
-        in node_ids])
+        graph = self._graph
+        return [
+            list(graph.edges(node_id)) if node_id in graph else None
+            for node_id in node_ids
+        ]
 
     async def upsert_node(self, node_id: str, node_data: dict[str, str]):
         self._graph.add_node(node_id, **node_data)
+        self._dirty_nodes.add(node_id)
 
     async def upsert_nodes_batch(self, nodes_data: list[tuple[str, dict[str, str]]]):
-        await asyncio.gather(*[self.upsert_node(node_id, node_data) for node_id, node_data in nodes_data])
+        self._graph.add_nodes_from(nodes_data)
+        self._dirty_nodes.update(node_id for node_id, _ in nodes_data)
 
     async def upsert_edge(
         self, source_node_id: str, target_node_id: str, edge_data: dict[str, str]
     ):
         self._graph.add_edge(source_node_id, target_node_id, **edge_data)
+        self._dirty_edges.add((source_node_id, target_node_id))
 
     async def upsert_edges_batch(
         self, edges_data: list[tuple[str, str, dict[str, str]]]
     ):
-        await asyncio.gather(*[self.upsert_edge(source_node_id, target_node_id, edge_data) 
-                for source_node_id, target_node_id, edge_data in edges_data])
-        
+        self._graph.add_edges_from(edges_data)
+        self._dirty_edges.update(
+            (source_node_id, target_node_id)
+            for source_node_id, target_node_id, _ in edges_data
+        )
+
     async def clustering(self, algorithm: str):
         if algorithm not in self._clustering_algorithms:
             raise ValueError(f"Clustering algorithm {algorithm} not supported")
@@ -225,7 +529,14 @@ class NetworkXStorage(BaseGraphStorage):
 
     def _cluster_data_to_subgraphs(self, cluster_data: dict[str, list[dict[str, str]]]):
         for node_id, clusters in cluster_data.items():
-            self._graph.nodes[node_id]["clusters"] = json.dumps(clusters)
+            clusters = json.dumps(clusters)
+            node_data = self._graph.nodes[node_id]
+            # reclustering mostly reproduces the stored assignment, only nodes
+            # whose clusters moved need to go into the next delta
+            if node_data.get("clusters") == clusters:
+                continue
+            node_data["clusters"] = clusters
+            self._dirty_nodes.add(node_id)
 
     async def _leiden_clustering(self):
         from graspologic.partition import hierarchical_leiden
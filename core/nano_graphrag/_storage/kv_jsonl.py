@@ -0,0 +1,178 @@
+import asyncio
+import json
+import os
+import tempfile
+from dataclasses import dataclass
+
+from .._utils import load_json, logger
+from ..base import (
+    BaseKVStorage,
+)
+
+
+@dataclass
+class JsonlKVStorage(BaseKVStorage):
+    """Append-only log variant of JsonKVStorage.
+
+    Every `upsert`/`drop` is buffered and appended to `kv_store_{namespace}.jsonl`
+    on `index_done_callback`, so the cost of a flush is proportional to the
+    records written instead of the whole namespace. The log is replayed on load
+    and rewritten as a single snapshot on the flush where it grows past
+    `compact_ratio` times the number of live keys.
+    """
+
+    compact_min_records: int = 1000
+    compact_ratio: float = 2.0
+
+    def __post_init__(self):
+        working_dir = self.global_config["working_dir"]
+        kv_params = self.global_config.get("key_string_value_json_storage_cls_kwargs", {})
+        self.compact_min_records = kv_params.get(
+            "compact_min_records", self.compact_min_records
+        )
+        self.compact_ratio = kv_params.get("compact_ratio", self.compact_ratio)
+
+        self._file_name = os.path.join(working_dir, f"kv_store_{self.namespace}.jsonl")
+        self._pending: list[dict] = []
+        self._log_records = 0
+        self._lock = asyncio.Lock()
+        self._lock_loop = None
+        self._data = {}
+        if os.path.exists(self._file_name):
+            self._replay_log()
+        else:
+            # migrate from the plain JSON store written by JsonKVStorage
+            legacy_file_name = os.path.join(
+                working_dir, f"kv_store_{self.namespace}.json"
+            )
+            self._data = load_json(legacy_file_name) or {}
+            if self._data:
+                self._write_snapshot(self._file_name, dict(self._data))
+                self._log_records = 1
+        logger.info(f"Load KV {self.namespace} with {len(self._data)} data")
+
+    def _replay_log(self):
+        with open(self._file_name, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # a crash in the middle of an append leaves a torn last line
+                    logger.warning(
+                        f"Skip broken record in {self._file_name}: {line[:50]}..."
+                    )
+                    continue
+                self._apply(record)
+                self._log_records += 1
+
+    def _apply(self, record: dict):
+        if record["op"] == "upsert":
+            self._data.update(record["data"])
+        elif record["op"] == "drop":
+            self._data = {}
+
+    @staticmethod
+    def _encode_records(records: list[dict]) -> str:
+        return "".join(
+            json.dumps(record, ensure_ascii=False) + "\n" for record in records
+        )
+
+    @staticmethod
+    def _write_snapshot(file_name: str, data: dict):
+        with open(file_name, "w", encoding="utf-8") as f:
+            f.write(
+                JsonlKVStorage._encode_records([{"op": "upsert", "data": data}])
+            )
+
+    def _append_records(self, records: list[dict]):
+        with open(self._file_name, "a", encoding="utf-8") as f:
+            f.write(self._encode_records(records))
+        self._log_records += len(records)
+
+    def _need_compaction(self) -> bool:
+        return self._log_records >= self.compact_min_records and (
+            self._log_records > self.compact_ratio * max(len(self._data), 1)
+        )
+
+    def _flush_lock(self) -> asyncio.Lock:
+        # LLMResponseCache flushes on a count and on a timer, so two flushes can
+        # overlap. app.py runs every call on a new event loop and an asyncio.Lock
+        # stays bound to the loop it first waited on, so an idle lock is renewed
+        loop = asyncio.get_running_loop()
+        if self._lock_loop is not loop and not self._lock.locked():
+            self._lock, self._lock_loop = asyncio.Lock(), loop
+        return self._lock
+
+    async def _compact(self):
+        if self._pending:
+            pending, self._pending = self._pending, []
+            self._append_records(pending)
+        snapshot = dict(self._data)
+        fd, tmp_file_name = tempfile.mkstemp(
+            prefix=os.path.basename(self._file_name) + ".",
+            suffix=".compact",
+            dir=os.path.dirname(self._file_name),
+        )
+        os.close(fd)
+        try:
+            await asyncio.to_thread(self._write_snapshot, tmp_file_name, snapshot)
+            # records buffered while the snapshot was written go after it
+            pending, self._pending = self._pending, []
+            with open(tmp_file_name, "a", encoding="utf-8") as f:
+                f.write(self._encode_records(pending))
+            os.replace(tmp_file_name, self._file_name)
+        except BaseException:
+            if os.path.exists(tmp_file_name):
+                os.remove(tmp_file_name)
+            raise
+        self._log_records = 1 + len(pending)
+        logger.info(
+            f"Compacted KV {self.namespace} log to {len(snapshot)} data"
+        )
+
+    async def compact(self):
+        """Rewrite the log as a single snapshot record"""
+        async with self._flush_lock():
+            await self._compact()
+
+    async def all_keys(self) -> list[str]:
+        return list(self._data.keys())
+
+    async def index_done_callback(self):
+        async with self._flush_lock():
+            if self._pending:
+                pending, self._pending = self._pending, []
+                self._append_records(pending)
+            if self._need_compaction():
+                # awaited here instead of left as a task, a task would be stranded
+                # once the caller's event loop is closed
+                await self._compact()
+
+    async def get_by_id(self, id):
+        return self._data.get(id, None)
+
+    async def get_by_ids(self, ids, fields=None):
+        if fields is None:
+            return [self._data.get(id, None) for id in ids]
+        return [
+            (
+                {k: v for k, v in self._data[id].items() if k in fields}
+                if self._data.get(id, None)
+                else None
+            )
+            for id in ids
+        ]
+
+    async def filter_keys(self, data: list[str]) -> set[str]:
+        return set([s for s in data if s not in self._data])
+
+    async def upsert(self, data: dict[str, dict]):
+        self._data.update(data)
+        self._pending.append({"op": "upsert", "data": dict(data)})
+
+    async def drop(self):
+        self._data = {}
+        self._pending.append({"op": "drop"})
@@ -0,0 +1,130 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+
+from .._utils import logger
+from ..base import (
+    BaseKVStorage,
+)
+
+
+@dataclass
+class LLMResponseCache(BaseKVStorage):
+    """Write-coalescing front of the KV storage holding LLM responses.
+
+    Upserts are kept in memory and handed to `kv` in a single `upsert` plus
+    `index_done_callback` once `flush_every` responses are pending or
+    `flush_interval` seconds passed since the last flush, instead of one disk
+    write per completion. Lookups check the pending responses first.
+    """
+
+    kv: BaseKVStorage = None
+    flush_every: int = 32
+    flush_interval: float = 5.0
+    hits: int = 0
+    misses: int = 0
+    flushes: int = 0
+    lookup_seconds: float = 0.0
+    _pending: dict = field(default_factory=dict)
+    _flushing: dict = field(default_factory=dict)
+    _lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    _lock_loop: asyncio.AbstractEventLoop = None
+
+    def __post_init__(self):
+        self.flush_every = self.global_config.get(
+            "llm_cache_flush_every", self.flush_every
+        )
+        self.flush_interval = self.global_config.get(
+            "llm_cache_flush_interval", self.flush_interval
+        )
+        self._last_flush = time.monotonic()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "avg_lookup_ms": self.lookup_seconds * 1000 / lookups if lookups else 0.0,
+            "pending": len(self._pending),
+            "flushes": self.flushes,
+        }
+
+    def _flush_lock(self) -> asyncio.Lock:
+        # one flush at a time, renewed when idle since an asyncio.Lock stays
+        # bound to the event loop it first waited on
+        loop = asyncio.get_running_loop()
+        if self._lock_loop is not loop and not self._lock.locked():
+            self._lock, self._lock_loop = asyncio.Lock(), loop
+        return self._lock
+
+    async def flush(self):
+        async with self._flush_lock():
+            await self._flush()
+
+    async def _flush(self):
+        if not self._pending:
+            return
+        self._flushing, self._pending = self._pending, {}
+        try:
+            await self.kv.upsert(self._flushing)
+            await self.kv.index_done_callback()
+        except BaseException:
+            # keep the responses visible and retry them with the next flush
+            self._pending = {**self._flushing, **self._pending}
+            raise
+        finally:
+            self._flushing = {}
+        self.flushes += 1
+        self._last_flush = time.monotonic()
+        logger.debug(f"Flushed LLM cache, {self.stats()}")
+
+    async def all_keys(self) -> list[str]:
+        keys = await self.kv.all_keys()
+        stored = set(keys)
+        return keys + [k for k in self._pending if k not in stored]
+
+    async def index_done_callback(self):
+        await self.flush()
+
+    async def get_by_id(self, id):
+        start = time.perf_counter()
+        result = self._pending.get(id) or self._flushing.get(id)
+        if result is None:
+            result = await self.kv.get_by_id(id)
+        self.lookup_seconds += time.perf_counter() - start
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    async def get_by_ids(self, ids, fields=None):
+        results = await self.kv.get_by_ids(ids, fields=fields)
+        for i, id in enumerate(ids):
+            pending = self._pending.get(id) or self._flushing.get(id)
+            if pending is not None:
+                results[i] = (
+                    pending
+                    if fields is None
+                    else {k: v for k, v in pending.items() if k in fields}
+                )
+        return results
+
+    async def filter_keys(self, data: list[str]) -> set[str]:
+        missing = await self.kv.filter_keys(data)
+        return set([s for s in missing if s not in self._pending])
+
+    async def upsert(self, data: dict[str, dict]):
+        self._pending.update(data)
+        if (
+            len(self._pending) >= self.flush_every
+            or time.monotonic() - self._last_flush >= self.flush_interval
+        ):
+            await self.flush()
+
+    async def drop(self):
+        async with self._flush_lock():
+            self._pending = {}
+            self._flushing = {}
+            await self.kv.drop()
@@ -0,0 +1,135 @@
+import json
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+
+from .._utils import load_json, logger
+from ..base import (
+    BaseKVStorage,
+)
+
+# stay below SQLITE_MAX_VARIABLE_NUMBER of older sqlite builds (999)
+SQLITE_BATCH_SIZE = 900
+
+
+@dataclass
+class SqliteKVStorage(BaseKVStorage):
+    """KV storage kept in `kv_store.sqlite` with one table per namespace.
+
+    Values are stored as JSON text and only decoded when read, so resident
+    memory does not grow with the namespace size.
+    """
+
+    def __post_init__(self):
+        working_dir = self.global_config["working_dir"]
+        self._file_name = os.path.join(working_dir, "kv_store.sqlite")
+        self._table = f'"kv_{self.namespace}"'
+        # GraphRAGManager drives the storage from several threads' event loops,
+        # the shared connection is only used under `_lock`
+        self._conn = sqlite3.connect(
+            self._file_name, timeout=30, check_same_thread=False
+        )
+        self._lock = threading.RLock()
+        with self._lock:
+            count = self._open_table(working_dir)
+        logger.info(f"Load KV {self.namespace} with {count} data")
+
+    def _open_table(self, working_dir: str) -> int:
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        created = (
+            self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (f"kv_{self.namespace}",),
+            ).fetchone()
+            is None
+        )
+        with self._conn:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self._table} "
+                "(id TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+        count = self._conn.execute(f"SELECT COUNT(*) FROM {self._table}").fetchone()[0]
+        if created:
+            # migrate from the plain JSON store written by JsonKVStorage, only once
+            # so that a dropped namespace is not re-seeded on the next open
+            legacy_data = load_json(
+                os.path.join(working_dir, f"kv_store_{self.namespace}.json")
+            )
+            if legacy_data:
+                self._upsert_rows(legacy_data)
+                count = len(legacy_data)
+        return count
+
+    def _upsert_rows(self, data: dict[str, dict]):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self._table} (id, value) VALUES (?, ?)",
+                [(k, json.dumps(v, ensure_ascii=False)) for k, v in data.items()],
+            )
+
+    def _select_values(self, ids: list[str]) -> dict[str, str]:
+        found = {}
+        for i in range(0, len(ids), SQLITE_BATCH_SIZE):
+            batch = ids[i : i + SQLITE_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            with self._lock:
+                found.update(
+                    self._conn.execute(
+                        f"SELECT id, value FROM {self._table} WHERE id IN ({placeholders})",
+                        batch,
+                    ).fetchall()
+                )
+        return found
+
+    async def all_keys(self) -> list[str]:
+        with self._lock:
+            rows = self._conn.execute(f"SELECT id FROM {self._table}").fetchall()
+        return [row[0] for row in rows]
+
+    async def index_done_callback(self):
+        # every upsert is committed in its own transaction, only fold the WAL back
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    async def get_by_id(self, id):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value FROM {self._table} WHERE id = ?", (id,)
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    async def get_by_ids(self, ids, fields=None):
+        found = self._select_values(list(ids))
+        results = []
+        for id in ids:
+            value = found.get(id)
+            if value is None:
+                results.append(None)
+                continue
+            value = json.loads(value)
+            if fields is not None:
+                value = {k: v for k, v in value.items() if k in fields}
+            results.append(value)
+        return results
+
+    async def filter_keys(self, data: list[str]) -> set[str]:
+        found = set()
+        for i in range(0, len(data), SQLITE_BATCH_SIZE):
+            batch = data[i : i + SQLITE_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT id FROM {self._table} WHERE id IN ({placeholders})",
+                    batch,
+                ).fetchall()
+            found.update(row[0] for row in rows)
+        return set([s for s in data if s not in found])
+
+    async def upsert(self, data: dict[str, dict]):
+        self._upsert_rows(data)
+
+    async def drop(self):
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self._table}")
@@ -1,7 +1,8 @@
 import asyncio
+import json
 import os
 from dataclasses import dataclass, field
-from typing import Any
+from typing import Any, Union
 import pickle
 import hnswlib
 import numpy as np
@@ -9,6 +10,213 @@ import xxhash
 
 from .._utils import logger
 from ..base import BaseVectorStorage
+from ._arrays import read_array_file, write_array_file
+
+HNSW_METADATA_MAGIC = b"NHNSWMD1"
+
+
+class HNSWMetadataTable:
+    """Per-label metadata stored as memory-mapped columns.
+
+    Every metadata field is a column of JSON-encoded values in one byte blob
+    with per-label offsets, so loading only maps the file and a row is decoded
+    when a query returns its label. Rows changed since the last `save` are
+    kept in memory on top of the mapped file.
+    """
+
+    def __init__(self, file_name: str):
+        self._file_name = file_name
+        self.header: dict = {}
+        self._columns: list[str] = ["id"]
+        self._size = 0
+        self._valid = np.zeros(0, dtype=np.uint8)
+        self._hashes = np.zeros(0, dtype=np.uint64)
+        self._blobs: dict[str, np.ndarray] = {}
+        self._offsets: dict[str, np.ndarray] = {}
+        self._rows: dict[int, tuple[dict, int]] = {}
+        self._deleted: set[int] = set()
+        self._id_to_label: dict[str, int] = None
+        self.count = 0
+        # whether `save` has anything to write
+        self._dirty = True
+        if os.path.exists(file_name):
+            self._load()
+
+    def _load(self):
+        self.header, arrays = read_array_file(self._file_name, HNSW_METADATA_MAGIC)
+        self._columns = self.header["columns"]
+        self._size = self.header["size"]
+        self._valid = arrays["valid"]
+        self._hashes = arrays["content_hashes"]
+        for i, column in enumerate(self._columns):
+            self._blobs[column] = arrays[f"column_{i}_blob"]
+            self._offsets[column] = arrays[f"column_{i}_offsets"]
+        self._rows = {}
+        self._deleted = set()
+        self._dirty = False
+        self.count = int(np.count_nonzero(self._valid))
+
+    def _stored_bytes(self, column: str, label: int) -> bytes:
+        if column not in self._offsets:
+            return b""
+        offsets = self._offsets[column]
+        return self._blobs[column][offsets[label] : offsets[label + 1]].tobytes()
+
+    def _stored(self, label: int) -> bool:
+        return (
+            label < self._size and label not in self._deleted and bool(self._valid[label])
+        )
+
+    def has(self, label: int) -> bool:
+        return label in self._rows or self._stored(label)
+
+    def get(self, label: int) -> Union[dict, None]:
+        label = int(label)
+        if label in self._rows:
+            return self._rows[label][0]
+        if not self._stored(label):
+            return None
+        row = {}
+        for column in self._columns:
+            value = self._stored_bytes(column, label)
+            if value:
+                row[column] = json.loads(value)
+        return row
+
+    def content_hash(self, label: int) -> Union[int, None]:
+        if label in self._rows:
+            return self._rows[label][1]
+        return int(self._hashes[label]) if self._stored(label) else None
+
+    @property
+    def id_to_label(self) -> dict[str, int]:
+        """id -> label of every live row, decoded on first use only"""
+        if self._id_to_label is None:
+            id_to_label = {}
+            for label in np.flatnonzero(self._valid).tolist():
+                if label not in self._deleted and label not in self._rows:
+                    id_to_label[json.loads(self._stored_bytes("id", label))] = label
+            for label, (metadata, _) in self._rows.items():
+                id_to_label[metadata["id"]] = label
+            self._id_to_label = id_to_label
+        return self._id_to_label
+
+    def set(self, label: int, metadata: dict, content_hash: int):
+        label = int(label)
+        if not self.has(label):
+            self.count += 1
+        self._rows[label] = (metadata, content_hash)
+        self._dirty = True
+        if self._id_to_label is not None:
+            self._id_to_label[metadata["id"]] = label
+
+    def delete(self, label: int):
+        label = int(label)
+        if not self.has(label):
+            return
+        if self._id_to_label is not None:
+            self._id_to_label.pop(self.get(label)["id"], None)
+        self._rows.pop(label, None)
+        if label < self._size:
+            self._deleted.add(label)
+        self._dirty = True
+        self.count -= 1
+
+    def relabel(self, old_labels: list[int]):
+        """Move the rows of `old_labels` to labels 0..len(old_labels)-1"""
+        rows = {
+            new_label: (self.get(old_label), self.content_hash(old_label))
+            for new_label, old_label in enumerate(old_labels)
+        }
+        self._size = 0
+        self._valid = np.zeros(0, dtype=np.uint8)
+        self._hashes = np.zeros(0, dtype=np.uint64)
+        self._blobs, self._offsets = {}, {}
+        self._deleted = set()
+        self._rows = rows
+        self._id_to_label = None
+        self._dirty = True
+        self.count = len(rows)
+
+    def _column_arrays(
+        self, column: str, size: int, encoded: dict[int, bytes]
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Blob and offsets of `column`, re-encoding only the rows in `encoded`"""
+        stored = column in self._offsets
+        lengths = np.zeros(size, dtype=np.int64)
+        if stored:
+            old_blob, old_offsets = self._blobs[column], self._offsets[column]
+            lengths[: self._size] = np.diff(old_offsets)
+        changed = sorted(set(encoded) | self._deleted)
+        lengths[changed] = [len(encoded.get(label, b"")) for label in changed]
+        offsets = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        blob = np.empty(int(offsets[-1]), dtype=np.uint8)
+
+        def copy_stored(start: int, stop: int):
+            # unchanged rows between two changed labels are one contiguous slice
+            stop = min(stop, self._size)
+            if stored and stop > start:
+                blob[offsets[start] : offsets[stop]] = old_blob[
+                    old_offsets[start] : old_offsets[stop]
+                ]
+
+        start = 0
+        for label in changed:
+            copy_stored(start, label)
+            if encoded.get(label):
+                blob[offsets[label] : offsets[label + 1]] = np.frombuffer(
+                    encoded[label], dtype=np.uint8
+                )
+            start = label + 1
+        copy_stored(start, self._size)
+        return blob, offsets
+
+    def save(self, **header):
+        if not self._dirty:
+            return
+        size = max([self._size] + [label + 1 for label in self._rows])
+        columns = list(self._columns)
+        for metadata, _ in self._rows.values():
+            columns.extend(k for k in metadata if k not in columns)
+
+        valid = np.zeros(size, dtype=np.uint8)
+        valid[: self._size] = self._valid
+        valid[list(self._deleted)] = 0
+        hashes = np.zeros(size, dtype=np.uint64)
+        hashes[: self._size] = self._hashes
+        for label, (_, content_hash) in self._rows.items():
+            valid[label] = 1
+            hashes[label] = content_hash or 0
+
+        arrays = {"valid": valid, "content_hashes": hashes}
+        blobs, offsets = {}, {}
+        for i, column in enumerate(columns):
+            encoded = {}
+            for label, (metadata, _) in self._rows.items():
+                value = metadata.get(column)
+                encoded[label] = (
+                    b"" if value is None else json.dumps(value).encode("utf-8")
+                )
+            blobs[column], offsets[column] = self._column_arrays(column, size, encoded)
+            arrays[f"column_{i}_blob"] = blobs[column]
+            arrays[f"column_{i}_offsets"] = offsets[column]
+
+        # drop the views mapped from the old file before it is replaced, a mapped
+        # file cannot be swapped on Windows
+        self._columns, self._size = columns, size
+        self._valid, self._hashes = valid, hashes
+        self._blobs, self._offsets = blobs, offsets
+        self._rows, self._deleted = {}, set()
+        write_array_file(
+            self._file_name,
+            HNSW_METADATA_MAGIC,
+            dict(header, columns=columns, size=size),
+            arrays,
+        )
+        id_to_label = self._id_to_label
+        self._load()
+        self._id_to_label = id_to_label
 
 
 @dataclass
@@ -18,15 +226,24 @@ class HNSWVectorStorage(BaseVectorStorage):
     max_elements: int = 1000000
     ef_search: int = 50
     num_threads: int = -1
+    # rebuild the index once this share of its slots are tombstones
+    compact_tombstone_ratio: float = 0.3
     _index: Any = field(init=False)
-    _metadata: dict[str, dict] = field(default_factory=dict)
+    _metadata: HNSWMetadataTable = field(init=False)
+    _next_label: int = 0
+    _num_deleted: int = 0
     _current_elements: int = 0
+    skipped_embeddings: int = 0
 
     def __post_init__(self):
         self._index_file_name = os.path.join(
             self.global_config["working_dir"], f"{self.namespace}_hnsw.index"
         )
         self._metadata_file_name = os.path.join(
+            self.global_config["working_dir"], f"{self.namespace}_hnsw_metadata.bin"
+        )
+        # metadata written before the columnar table existed
+        self._legacy_metadata_file_name = os.path.join(
             self.global_config["working_dir"], f"{self.namespace}_hnsw_metadata.pkl"
         )
         self._embedding_batch_num = self.global_config.get("embedding_batch_num", 100)
@@ -37,42 +254,116 @@ class HNSWVectorStorage(BaseVectorStorage):
         self.max_elements = hnsw_params.get("max_elements", self.max_elements)
         self.ef_search = hnsw_params.get("ef_search", self.ef_search)
         self.num_threads = hnsw_params.get("num_threads", self.num_threads)
+        self.compact_tombstone_ratio = hnsw_params.get(
+            "compact_tombstone_ratio", self.compact_tombstone_ratio
+        )
         self._index = hnswlib.Index(
             space="cosine", dim=self.embedding_func.embedding_dim
         )
 
-        if os.path.exists(self._index_file_name) and os.path.exists(
-            self._metadata_file_name
+        has_metadata = os.path.exists(self._metadata_file_name)
+        has_legacy_metadata = os.path.exists(self._legacy_metadata_file_name)
+        if os.path.exists(self._index_file_name) and (
+            has_metadata or has_legacy_metadata
         ):
             self._index.load_index(
-                self._index_file_name, max_elements=self.max_elements
+                self._index_file_name,
+                max_elements=self.max_elements,
+                allow_replace_deleted=True,
             )
-            with open(self._metadata_file_name, "rb") as f:
-                self._metadata, self._current_elements = pickle.load(f)
+            self._index.set_ef(self.ef_search)
+            if has_metadata:
+                self._metadata = HNSWMetadataTable(self._metadata_file_name)
+                self._next_label = self._metadata.header["next_label"]
+                self._num_deleted = self._metadata.header["num_deleted"]
+            else:
+                self._load_legacy_metadata()
+            self._current_elements = self._metadata.count
             logger.info(
                 f"Loaded existing index for {self.namespace} with {self._current_elements} elements"
             )
         else:
-            self._index.init_index(
-                max_elements=self.max_elements,
-                ef_construction=self.ef_construction,
-                M=self.M,
-            )
-            self._index.set_ef(self.ef_search)
-            self._metadata = {}
+            self._init_index(self.max_elements)
+            self._metadata = HNSWMetadataTable(self._metadata_file_name)
+            self._next_label = 0
+            self._num_deleted = 0
             self._current_elements = 0
             logger.info(f"Created new index for {self.namespace}")
 
+    def _load_legacy_metadata(self):
+        with open(self._legacy_metadata_file_name, "rb") as f:
+            saved = pickle.load(f)
+        self._metadata = HNSWMetadataTable(self._metadata_file_name)
+        # labels were xxh32 digests of the ids, rebuild with dense labels
+        for label, metadata in saved[0].items():
+            self._metadata.set(int(label), metadata, None)
+        self._next_label = max(self._metadata.id_to_label.values(), default=-1) + 1
+        self._num_deleted = 0
+        self._compact()
+
+    def _init_index(self, max_elements: int):
+        self._index = hnswlib.Index(
+            space="cosine", dim=self.embedding_func.embedding_dim
+        )
+        self._index.init_index(
+            max_elements=max_elements,
+            ef_construction=self.ef_construction,
+            M=self.M,
+            allow_replace_deleted=True,
+        )
+        self._index.set_ef(self.ef_search)
+
+    def _ensure_capacity(self, num_new: int):
+        # tombstoned slots are reused by `replace_deleted`, the rest needs fresh slots
+        needed = self._index.get_current_count() + max(num_new - self._num_deleted, 0)
+        capacity = self._index.get_max_elements()
+        if needed > capacity:
+            new_capacity = max(needed, capacity * 2)
+            logger.info(
+                f"Resizing index {self.namespace} from {capacity} to {new_capacity} elements"
+            )
+            self._index.resize_index(new_capacity)
+
+    def _labels_of(self, ids: list[str]) -> np.ndarray:
+        id_to_label = self._metadata.id_to_label
+        return np.fromiter(
+            (id_to_label[id] for id in ids), dtype=np.uint64, count=len(ids)
+        )
+
     async def upsert(self, data: dict[str, dict]) -> np.ndarray:
         logger.info(f"Inserting {len(data)} vectors to {self.namespace}")
         if not data:
             logger.warning("You insert an empty data to vector DB")
             return []
 
-        if self._current_elements + len(data) > self.max_elements:
-            raise ValueError(
-                f"Cannot insert {len(data)} elements. Current: {self._current_elements}, Max: {self.max_elements}"
+        content_hashes = {
+            k: xxhash.xxh3_64_intdigest(v["content"].encode()) for k, v in data.items()
+        }
+        id_to_label = self._metadata.id_to_label
+        # only the metadata of ids whose content didn't change needs refreshing
+        unchanged = [
+            k
+            for k, h in content_hashes.items()
+            if k in id_to_label and self._metadata.content_hash(id_to_label[k]) == h
+        ]
+        for k in unchanged:
+            self._metadata.set(
+                id_to_label[k],
+                {
+                    "id": k,
+                    **{k1: v1 for k1, v1 in data[k].items() if k1 in self.meta_fields},
+                },
+                content_hashes[k],
+            )
+        if unchanged:
+            self.skipped_embeddings += len(unchanged)
+            logger.info(
+                f"Skipped embedding {len(unchanged)}/{len(data)} unchanged vectors in {self.namespace}"
             )
+            unchanged = set(unchanged)
+            data = {k: v for k, v in data.items() if k not in unchanged}
+            if not data:
+                return self._labels_of(list(content_hashes))
 
         list_data = [
             {
@@ -92,50 +383,118 @@ class HNSWVectorStorage(BaseVectorStorage):
             )
         )
 
-        ids = np.fromiter(
-            (xxhash.xxh32_intdigest(d["id"].encode()) for d in list_data),
-            dtype=np.uint32,
-            count=len(list_data),
+        # existing ids keep their label, hnswlib updates the vector in place
+        is_new = np.array([d["id"] not in id_to_label for d in list_data])
+        new_count = int(is_new.sum())
+        self._ensure_capacity(new_count)
+        for d in list_data:
+            label = id_to_label.get(d["id"])
+            if label is None:
+                label = self._next_label
+                self._next_label += 1
+            self._metadata.set(label, d, content_hashes[d["id"]])
+        ids = self._labels_of([d["id"] for d in list_data])
+        if (~is_new).any():
+            self._index.add_items(
+                data=embeddings[~is_new], ids=ids[~is_new], num_threads=self.num_threads
+            )
+        if new_count:
+            reused = min(new_count, self._num_deleted)
+            self._index.add_items(
+                data=embeddings[is_new],
+                ids=ids[is_new],
+                num_threads=self.num_threads,
+                replace_deleted=reused > 0,
+            )
+            self._num_deleted -= reused
+        self._current_elements = self._metadata.count
+        return self._labels_of(list(content_hashes))
+
+    async def delete(self, ids: list[str]):
+        id_to_label = self._metadata.id_to_label
+        for id in ids:
+            label = id_to_label.get(id)
+            if label is None:
+                continue
+            self._index.mark_deleted(label)
+            self._metadata.delete(label)
+            self._num_deleted += 1
+        self._current_elements = self._metadata.count
+
+    async def compact(self):
+        """Rebuild the index without tombstones, relabeling ids densely from 0"""
+        self._compact()
+
+    def _compact(self):
+        old_labels = list(self._metadata.id_to_label.values())
+        vectors = (
+            np.asarray(self._index.get_items(old_labels), dtype=np.float32)
+            if old_labels
+            else None
         )
-        self._metadata.update(
-            {
-                id_int: {
-                    k: v for k, v in d.items() if k in self.meta_fields or k == "id"
-                }
-                for id_int, d in zip(ids, list_data)
-            }
+        self._init_index(max(self.max_elements, len(old_labels)))
+        self._metadata.relabel(old_labels)
+        if old_labels:
+            self._index.add_items(
+                data=vectors,
+                ids=np.arange(len(old_labels)),
+                num_threads=self.num_threads,
+            )
+        self._next_label = len(old_labels)
+        self._num_deleted = 0
+        self._current_elements = len(old_labels)
+        logger.info(
+            f"Compacted index {self.namespace} to {self._current_elements} elements"
         )
-        self._index.add_items(data=embeddings, ids=ids, num_threads=self.num_threads)
-        self._current_elements = self._index.get_current_count()
-        return ids
 
     async def query(self, query: str, top_k: int = 5) -> list[dict]:
-        if self._current_elements == 0:
-            return []
+        return (await self.query_batch([query], top_k=top_k))[0]
+
+    async def query_batch(self, queries: list[str], top_k: int = 5) -> list[list[dict]]:
+        if self._current_elements == 0 or not queries:
+            return [[] for _ in queries]
 
         top_k = min(top_k, self._current_elements)
 
+        embeddings = await self.embedding_func(queries)
+        # hnswlib only has an index-wide ef, raise it for this call and restore after
         if top_k > self.ef_search:
-            logger.warning(
-                f"Setting ef_search to {top_k} because top_k is larger than ef_search"
+            logger.debug(
+                f"Using ef_search={top_k} for this query because top_k is larger than ef_search"
             )
             self._index.set_ef(top_k)
-
-        embedding = await self.embedding_func([query])
-        labels, distances = self._index.knn_query(
-            data=embedding[0], k=top_k, num_threads=self.num_threads
-        )
+        try:
+            labels, distances = self._index.knn_query(
+                data=np.asarray(embeddings, dtype=np.float32).reshape(len(queries), -1),
+                k=top_k,
+                num_threads=self.num_threads,
+            )
+        finally:
+            if top_k > self.ef_search:
+                self._index.set_ef(self.ef_search)
 
         return [
-            {
-                **self._metadata.get(label, {}),
-                "distance": distance,
-                "similarity": 1 - distance,
-            }
-            for label, distance in zip(labels[0], distances[0])
+            [
+                {
+                    **(self._metadata.get(label) or {}),
+                    "distance": distance,
+                    "similarity": 1 - distance,
+                }
+                for label, distance in zip(query_labels, query_distances)
+            ]
+            for query_labels, query_distances in zip(labels, distances)
         ]
 
     async def index_done_callback(self):
+        if (
+            self._num_deleted
+            and self._num_deleted
+            > self.compact_tombstone_ratio * self._index.get_current_count()
+        ):
+            await self.compact()
         self._index.save_index(self._index_file_name)
-        with open(self._metadata_file_name, "wb") as f:
-            pickle.dump((self._metadata, self._current_elements), f)
+        self._metadata.save(
+            next_label=self._next_label, num_deleted=self._num_deleted
+        )
+        if os.path.exists(self._legacy_metadata_file_name):
+            os.remove(self._legacy_metadata_file_name)
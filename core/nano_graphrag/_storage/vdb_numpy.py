@@ -0,0 +1,226 @@
+import asyncio
+import json
+import os
+from dataclasses import dataclass, field
+
+import numpy as np
+import xxhash
+
+from .._utils import logger
+from ..base import BaseVectorStorage
+
+
+@dataclass
+class NumpyVectorStorage(BaseVectorStorage):
+    """Exact cosine search by brute-force matrix multiply.
+
+    Vectors are normalized once at insert and kept as rows of one contiguous
+    matrix, persisted as `{namespace}_vectors.npy` (memory-mapped on load
+    until the first write). Faster than HNSW for small collections, and the
+    ground truth for HNSW recall measurements.
+    """
+
+    dtype: str = "float32"
+    mmap: bool = True
+    _ids: list[str] = field(default_factory=list)
+    _id_to_row: dict[str, int] = field(default_factory=dict)
+    _metadata: list[dict] = field(default_factory=list)
+    _content_hashes: list[int] = field(default_factory=list)
+    _matrix_dirty: bool = False
+    _metadata_dirty: bool = False
+    skipped_embeddings: int = 0
+
+    def __post_init__(self):
+        self._matrix_file_name = os.path.join(
+            self.global_config["working_dir"], f"{self.namespace}_vectors.npy"
+        )
+        self._metadata_file_name = os.path.join(
+            self.global_config["working_dir"], f"{self.namespace}_vectors_meta.json"
+        )
+        self._embedding_batch_num = self.global_config.get("embedding_batch_num", 100)
+
+        numpy_params = self.global_config.get("vector_db_storage_cls_kwargs", {})
+        self.dtype = numpy_params.get("dtype", self.dtype)
+        self.mmap = numpy_params.get("mmap", self.mmap)
+        if self.dtype not in ("float32", "float16"):
+            raise ValueError(f"Vector dtype {self.dtype} not supported")
+
+        if os.path.exists(self._matrix_file_name) and os.path.exists(
+            self._metadata_file_name
+        ):
+            self._matrix = np.load(
+                self._matrix_file_name, mmap_mode="r" if self.mmap else None
+            )
+            with open(self._metadata_file_name, encoding="utf-8") as f:
+                saved = json.load(f)
+            self._ids = saved["ids"]
+            self._metadata = saved["metadata"]
+            self._content_hashes = saved["content_hashes"]
+            self._id_to_row = {id: i for i, id in enumerate(self._ids)}
+            logger.info(
+                f"Loaded existing vectors for {self.namespace} with {len(self._ids)} elements"
+            )
+        else:
+            self._matrix = np.zeros(
+                (0, self.embedding_func.embedding_dim), dtype=self.dtype
+            )
+            logger.info(f"Created new vectors for {self.namespace}")
+
+    @property
+    def _size(self) -> int:
+        return len(self._ids)
+
+    def _writable_matrix(self, size: int) -> np.ndarray:
+        """Return an in-memory matrix with room for `size` rows, growing geometrically"""
+        if isinstance(self._matrix, np.memmap) or size > self._matrix.shape[0]:
+            capacity = self._matrix.shape[0]
+            if size > capacity:
+                capacity = max(size, capacity * 2, 64)
+            matrix = np.zeros(
+                (capacity, self.embedding_func.embedding_dim), dtype=self.dtype
+            )
+            matrix[: self._size] = self._matrix[: self._size]
+            self._matrix = matrix
+        return self._matrix
+
+    async def upsert(self, data: dict[str, dict]):
+        logger.info(f"Inserting {len(data)} vectors to {self.namespace}")
+        if not data:
+            logger.warning("You insert an empty data to vector DB")
+            return []
+
+        content_hashes = {
+            k: xxhash.xxh3_64_intdigest(v["content"].encode()) for k, v in data.items()
+        }
+        for k, v in data.items():
+            if k in self._id_to_row:
+                self._metadata[self._id_to_row[k]] = {
+                    "id": k,
+                    **{k1: v1 for k1, v1 in v.items() if k1 in self.meta_fields},
+                }
+                self._metadata_dirty = True
+        need_embedding = [
+            k
+            for k, h in content_hashes.items()
+            if k not in self._id_to_row
+            or self._content_hashes[self._id_to_row[k]] != h
+        ]
+        if len(need_embedding) < len(data):
+            self.skipped_embeddings += len(data) - len(need_embedding)
+            logger.info(
+                f"Skipped embedding {len(data) - len(need_embedding)}/{len(data)} unchanged vectors in {self.namespace}"
+            )
+        if not need_embedding:
+            return list(data.keys())
+
+        contents = [data[k]["content"] for k in need_embedding]
+        batch_size = min(self._embedding_batch_num, len(contents))
+        embeddings = np.concatenate(
+            await asyncio.gather(
+                *[
+                    self.embedding_func(contents[i : i + batch_size])
+                    for i in range(0, len(contents), batch_size)
+                ]
+            )
+        ).astype(np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings /= np.maximum(norms, 1e-12)
+
+        new_ids = [k for k in need_embedding if k not in self._id_to_row]
+        matrix = self._writable_matrix(self._size + len(new_ids))
+        for k in new_ids:
+            self._id_to_row[k] = len(self._ids)
+            self._ids.append(k)
+            self._metadata.append(
+                {
+                    "id": k,
+                    **{k1: v1 for k1, v1 in data[k].items() if k1 in self.meta_fields},
+                }
+            )
+            self._content_hashes.append(0)
+        rows = np.fromiter(
+            (self._id_to_row[k] for k in need_embedding),
+            dtype=np.int64,
+            count=len(need_embedding),
+        )
+        matrix[rows] = embeddings
+        self._matrix_dirty = self._metadata_dirty = True
+        for k in need_embedding:
+            self._content_hashes[self._id_to_row[k]] = content_hashes[k]
+        return list(data.keys())
+
+    async def delete(self, ids: list[str]):
+        for id in ids:
+            row = self._id_to_row.pop(id, None)
+            if row is None:
+                continue
+            # move the last row into the hole to keep the matrix contiguous
+            last = self._size - 1
+            matrix = self._writable_matrix(self._size)
+            if row != last:
+                last_id = self._ids[last]
+                matrix[row] = matrix[last]
+                self._ids[row] = last_id
+                self._metadata[row] = self._metadata[last]
+                self._content_hashes[row] = self._content_hashes[last]
+                self._id_to_row[last_id] = row
+            self._ids.pop()
+            self._metadata.pop()
+            self._content_hashes.pop()
+            self._matrix_dirty = self._metadata_dirty = True
+
+    async def query(self, query: str, top_k: int = 5) -> list[dict]:
+        return (await self.query_batch([query], top_k=top_k))[0]
+
+    async def query_batch(self, queries: list[str], top_k: int = 5) -> list[list[dict]]:
+        if self._size == 0 or not queries:
+            return [[] for _ in queries]
+        top_k = min(top_k, self._size)
+
+        embeddings = np.array(
+            await self.embedding_func(queries), dtype=np.float32
+        ).reshape(len(queries), -1)
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        scores = embeddings @ np.asarray(self._matrix[: self._size], dtype=np.float32).T
+
+        if top_k < self._size:
+            top_rows = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+        else:
+            top_rows = np.tile(np.arange(self._size), (len(queries), 1))
+        top_scores = np.take_along_axis(scores, top_rows, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top_rows = np.take_along_axis(top_rows, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        return [
+            [
+                {
+                    **self._metadata[row],
+                    "distance": 1 - score,
+                    "similarity": score,
+                }
+                for row, score in zip(query_rows.tolist(), query_scores.tolist())
+            ]
+            for query_rows, query_scores in zip(top_rows, top_scores)
+        ]
+
+    async def index_done_callback(self):
+        if self._matrix_dirty:
+            # write aside and swap, a memory-mapped copy of the old file may be in use
+            tmp_file_name = self._matrix_file_name + ".tmp"
+            with open(tmp_file_name, "wb") as f:
+                np.save(f, np.ascontiguousarray(self._matrix[: self._size]))
+            os.replace(tmp_file_name, self._matrix_file_name)
+            self._matrix_dirty = False
+        if self._metadata_dirty:
+            with open(self._metadata_file_name, "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "ids": self._ids,
+                        "metadata": self._metadata,
+                        "content_hashes": self._content_hashes,
+                    },
+                    f,
+                    ensure_ascii=False,
+                )
+            self._metadata_dirty = False
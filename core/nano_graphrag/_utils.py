@@ -5,6 +5,9 @@ import logging
 import os
 import re
 import numbers
+import threading
+import time
+from collections import OrderedDict, deque
 from dataclasses import dataclass
 from functools import wraps
 from hashlib import md5
@@ -12,10 +15,10 @@ from typing import Any, Union
 
 import numpy as np
 import tiktoken
+import xxhash
 
 logger = logging.getLogger("nano-graphrag")
 logging.getLogger("neo4j").setLevel(logging.ERROR)
-ENCODER = None
 
 def always_get_an_event_loop() -> asyncio.AbstractEventLoop:
     try:
@@ -118,32 +121,123 @@ def convert_response_to_json(response: str) -> dict:
 
 
 
+class Tokenizer:
+    """tiktoken encoding of one model, with an LRU cache of token counts.
+
+    Counts are cached per string because the same community reports and
+    entity descriptions are measured again on every query and merge. Safe to
+    share between threads.
+    """
+
+    def __init__(self, model_name: str, cache_size: int = 16384):
+        self.model_name = model_name
+        self.encoding = tiktoken.encoding_for_model(model_name)
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._counts: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def encode(self, content: str) -> list[int]:
+        return self.encoding.encode(content)
+
+    def encode_batch(self, contents: list[str], num_threads: int = 8) -> list[list[int]]:
+        return self.encoding.encode_batch(contents, num_threads=num_threads)
+
+    def decode(self, tokens: list[int]) -> str:
+        return self.encoding.decode(tokens)
+
+    def count(self, content: str, cache: bool = True) -> int:
+        return self.count_batch([content], cache=cache)[0]
+
+    def count_batch(self, contents: list[str], cache: bool = True) -> list[int]:
+        """Token counts of `contents`, `cache=False` keeps one-off texts out of the LRU"""
+        if not cache:
+            if len(contents) == 1:
+                return [len(self.encoding.encode(contents[0]))]
+            return [len(t) for t in self.encode_batch(contents)]
+        counts = [None] * len(contents)
+        missing = {}
+        with self._lock:
+            for i, content in enumerate(contents):
+                count = self._counts.get(content)
+                if count is None:
+                    missing.setdefault(content, []).append(i)
+                else:
+                    self._counts.move_to_end(content)
+                    counts[i] = count
+            self.hits += len(contents) - sum(map(len, missing.values()))
+            self.misses += len(missing)
+        if not missing:
+            return counts
+        # encode outside the lock, tiktoken releases the GIL
+        missing_contents = list(missing.keys())
+        if len(missing_contents) == 1:
+            missing_counts = [len(self.encoding.encode(missing_contents[0]))]
+        else:
+            missing_counts = [len(t) for t in self.encode_batch(missing_contents)]
+        with self._lock:
+            for content, count in zip(missing_contents, missing_counts):
+                for i in missing[content]:
+                    counts[i] = count
+                self._counts[content] = count
+                self._counts.move_to_end(content)
+            while len(self._counts) > self.cache_size:
+                self._counts.popitem(last=False)
+        return counts
+
+
+_tokenizers: dict[str, Tokenizer] = {}
+_tokenizers_lock = threading.Lock()
+
+
+def get_tokenizer(model_name: str = "gpt-4o") -> Tokenizer:
+    with _tokenizers_lock:
+        tokenizer = _tokenizers.get(model_name)
+        if tokenizer is None:
+            tokenizer = Tokenizer(model_name)
+            _tokenizers[model_name] = tokenizer
+        return tokenizer
+
+
 def encode_string_by_tiktoken(content: str, model_name: str = "gpt-4o"):
-    global ENCODER
-    if ENCODER is None:
-        ENCODER = tiktoken.encoding_for_model(model_name)
-    tokens = ENCODER.encode(content)
-    return tokens
+    return get_tokenizer(model_name).encode(content)
 
 
 def decode_tokens_by_tiktoken(tokens: list[int], model_name: str = "gpt-4o"):
-    global ENCODER
-    if ENCODER is None:
-        ENCODER = tiktoken.encoding_for_model(model_name)
-    content = ENCODER.decode(tokens)
-    return content
+    return get_tokenizer(model_name).decode(tokens)
 
 
-def truncate_list_by_token_size(list_data: list, key: callable, max_token_size: int):
-    """Truncate a list of data by token size"""
+def truncate_list_by_token_size(
+    list_data: list,
+    key: callable,
+    max_token_size: int,
+    count_key: callable = None,
+    tokenizer: Tokenizer = None,
+):
+    """Truncate a list of data by token size.
+
+    `count_key` gives the token count stored with an item, items it returns None
+    for are counted from `key` with `tokenizer`, gpt-4o's by default.
+    """
     if max_token_size <= 0:
         return []
-    tokens = 0
-    for i, data in enumerate(list_data):
-        tokens += len(encode_string_by_tiktoken(key(data)))
-        if tokens > max_token_size:
-            return list_data[:i]
-    return list_data
+    if tokenizer is None:
+        tokenizer = get_tokenizer()
+    if count_key is None:
+        counts = tokenizer.count_batch([key(data) for data in list_data])
+    else:
+        counts = [count_key(data) for data in list_data]
+        missing = [i for i, count in enumerate(counts) if count is None]
+        if missing:
+            missing_counts = tokenizer.count_batch(
+                [key(list_data[i]) for i in missing]
+            )
+            for i, count in zip(missing, missing_counts):
+                counts[i] = count
+    # first item whose cumulative count exceeds the budget
+    cut = np.searchsorted(np.cumsum(counts), max_token_size, side="right")
+    return list_data[: int(cut)]
 
 
 def compute_mdhash_id(content, prefix: str = ""):
@@ -176,12 +270,17 @@ def pack_user_ass_to_openai_messages(prompt: str, generated_content: str, using_
         ]
 
 
+_FLOAT_PATTERN = re.compile(r"^[-+]?[0-9]*\.?[0-9]+$")
+
+
 def is_float_regex(value):
-    return bool(re.match(r"^[-+]?[0-9]*\.?[0-9]+$", value))
+    return bool(_FLOAT_PATTERN.match(value))
 
 
 def compute_args_hash(*args):
-    return md5(str(args).encode()).hexdigest()
+    """Stable hash of the call args, dict keys are sorted so kwargs order doesn't matter"""
+    canonical = json.dumps(args, sort_keys=True, ensure_ascii=False, default=str)
+    return xxhash.xxh3_128_hexdigest(canonical.encode())
 
 
 def split_string_by_multi_markers(content: str, markers: list[str]) -> list[str]:
@@ -213,6 +312,9 @@ def list_of_list_to_csv(data: list[list]):
 # -----------------------------------------------------------------------------------
 # Refer the utils functions of the official GraphRAG implementation:
 # https://github.com/microsoft/graphrag
+_CONTROL_CHARS_PATTERN = re.compile(r"[\x00-\x1f\x7f-\x9f]")
+
+
 def clean_str(input: Any) -> str:
     """Clean an input string by removing HTML escapes, control characters, and other unwanted characters."""
     # If we get non-string input, just give it back
@@ -221,7 +323,7 @@ def clean_str(input: Any) -> str:
 
     result = html.unescape(input.strip())
     # https://stackoverflow.com/questions/4324790/removing-control-characters-from-a-string-in-python
-    return re.sub(r"[\x00-\x1f\x7f-\x9f]", "", result)
+    return _CONTROL_CHARS_PATTERN.sub("", result)
 
 
 # Utils types -----------------------------------------------------------------------
@@ -236,23 +338,113 @@ class EmbeddingFunc:
 
 
 # Decorators ------------------------------------------------------------------------
-def limit_async_func_call(max_size: int, waitting_time: float = 0.0001):
+class AsyncCallLimiter:
+    """FIFO limiter of concurrent calls, usable from several event loops.
+
+    A released slot is handed directly to the oldest waiter, so waiting calls
+    sleep on a future instead of polling. Not an `asyncio.Semaphore` because
+    GraphRAGManager drives the same GraphRAG instance from several threads'
+    event loops and a semaphore binds to the first one.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.running = 0
+        self.calls = 0
+        self.waited_calls = 0
+        self.max_queue_depth = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._lock = threading.Lock()
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queued": len(self._waiters),
+            "calls": self.calls,
+            "waited_calls": self.waited_calls,
+            "max_queue_depth": self.max_queue_depth,
+            "avg_wait_ms": self.wait_seconds * 1000 / self.calls if self.calls else 0.0,
+            "max_wait_ms": self.max_wait_seconds * 1000,
+        }
+
+    async def acquire(self):
+        with self._lock:
+            self.calls += 1
+            if self.running < self.max_size and not self._waiters:
+                self.running += 1
+                return
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            self.waited_calls += 1
+            self.max_queue_depth = max(self.max_queue_depth, len(self._waiters))
+        start = time.perf_counter()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            with self._lock:
+                if not waiter.cancelled():
+                    # the slot was handed over right before the cancellation
+                    self._release()
+                elif waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            raise
+        waited = time.perf_counter() - start
+        with self._lock:
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+    def release(self):
+        with self._lock:
+            self._release()
+
+    def resize(self, max_size: int):
+        with self._lock:
+            self.max_size = max_size
+            # hand the new slots to waiters right away
+            while self.running < self.max_size and self._waiters:
+                self.running += 1
+                self._release()
+
+    def _release(self):
+        if self.running > self.max_size:
+            # shrunk by `resize`, retire the slot instead of handing it over
+            self.running -= 1
+            return
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            try:
+                waiter.get_loop().call_soon_threadsafe(self._hand_over, waiter)
+                return
+            except RuntimeError:
+                # the waiter's event loop is closed
+                continue
+        self.running -= 1
+
+    def _hand_over(self, waiter: asyncio.Future):
+        if waiter.done():
+            # cancelled after being dequeued, pass the slot on
+            self.release()
+        else:
+            waiter.set_result(None)
+
+
+def limit_async_func_call(max_size: int):
     """Add restriction of maximum async calling times for a async func"""
 
     def final_decro(func):
-        """Not using async.Semaphore to aovid use nest-asyncio"""
-        __current_size = 0
+        limiter = AsyncCallLimiter(max_size)
 
         @wraps(func)
         async def wait_func(*args, **kwargs):
-            nonlocal __current_size
-            while __current_size >= max_size:
-                await asyncio.sleep(waitting_time)
-            __current_size += 1
-            result = await func(*args, **kwargs)
-            __current_size -= 1
-            return result
+            await limiter.acquire()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                limiter.release()
 
+        wait_func.limiter = limiter
         return wait_func
 
     return final_decro
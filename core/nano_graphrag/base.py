@@ -50,7 +50,9 @@ SingleCommunitySchema = TypedDict(
 
 class CommunitySchema(SingleCommunitySchema):
     report_string: str
+    report_tokens: int
     report_json: dict
+    fingerprint: str
 
 
 T = TypeVar("T")
@@ -82,12 +84,18 @@ class BaseVectorStorage(StorageNameSpace):
     async def query(self, query: str, top_k: int) -> list[dict]:
         raise NotImplementedError
 
+    async def query_batch(self, queries: list[str], top_k: int) -> list[list[dict]]:
+        return [await self.query(query, top_k) for query in queries]
+
     async def upsert(self, data: dict[str, dict]):
         """Use 'content' field from value for embedding, use key as id.
         If embedding_func is None, use 'embedding' field from value
         """
         raise NotImplementedError
 
+    async def delete(self, ids: list[str]):
+        raise NotImplementedError
+
 
 @dataclass
 class BaseKVStorage(Generic[T], StorageNameSpace):
@@ -118,13 +126,19 @@ class BaseGraphStorage(StorageNameSpace):
     async def has_node(self, node_id: str) -> bool:
         raise NotImplementedError
 
+    async def has_nodes_batch(self, node_ids: list[str]) -> list[bool]:
+        raise NotImplementedError
+
     async def has_edge(self, source_node_id: str, target_node_id: str) -> bool:
         raise NotImplementedError
 
+    async def has_edges_batch(self, edge_pairs: list[tuple[str, str]]) -> list[bool]:
+        raise NotImplementedError
+
     async def node_degree(self, node_id: str) -> int:
         raise NotImplementedError
     
-    async def node_degrees_batch(self, node_ids: List[str]) -> List[str]:
+    async def node_degrees_batch(self, node_ids: List[str]) -> List[int]:
         raise NotImplementedError
 
     async def edge_degree(self, src_id: str, tgt_id: str) -> int:
@@ -136,7 +150,7 @@ class BaseGraphStorage(StorageNameSpace):
     async def get_node(self, node_id: str) -> Union[dict, None]:
         raise NotImplementedError
 
-    async def get_nodes_batch(self, node_ids: list[str]) -> dict[str, Union[dict, None]]:
+    async def get_nodes_batch(self, node_ids: list[str]) -> list[Union[dict, None]]:
         raise NotImplementedError
 
     async def get_edge(
@@ -12,7 +12,7 @@ from nano_graphrag.base import (
 from nano_graphrag.prompt import PROMPTS
 from nano_graphrag._utils import logger, compute_mdhash_id
 from nano_graphrag.entity_extraction.module import TypedEntityRelationshipExtractor
-from nano_graphrag._op import _merge_edges_then_upsert, _merge_nodes_then_upsert
+from nano_graphrag._op import _merge_extraction_results
 
 
 async def generate_dataset(
@@ -136,24 +136,8 @@ async def extract_entities_dspy(
         *[_process_single_content(c) for c in ordered_chunks]
     )
     print()
-    maybe_nodes = defaultdict(list)
-    maybe_edges = defaultdict(list)
-    for m_nodes, m_edges in results:
-        for k, v in m_nodes.items():
-            maybe_nodes[k].extend(v)
-        for k, v in m_edges.items():
-            maybe_edges[k].extend(v)
-    all_entities_data = await asyncio.gather(
-        *[
-            _merge_nodes_then_upsert(k, v, knwoledge_graph_inst, global_config)
-            for k, v in maybe_nodes.items()
-        ]
-    )
-    await asyncio.gather(
-        *[
-            _merge_edges_then_upsert(k[0], k[1], v, knwoledge_graph_inst, global_config)
-            for k, v in maybe_edges.items()
-        ]
+    all_entities_data = await _merge_extraction_results(
+        results, knwoledge_graph_inst, global_config
     )
     if not len(all_entities_data):
         logger.warning("Didn't extract any entities, maybe your LLM is not working")
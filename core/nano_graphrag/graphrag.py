@@ -1,5 +1,6 @@
 import asyncio
 import os
+from collections import Counter
 from dataclasses import asdict, dataclass, field
 from datetime import datetime
 from functools import partial
@@ -21,13 +22,16 @@ from ._op import (
     extract_entities,
     generate_community_report,
     get_chunks,
+    get_chunks_in_process_pool,
     local_query,
     global_query,
     naive_query,
 )
+from ._rate_limit import configure_rate_limits
 from ._storage import (
     JsonKVStorage,
     HNSWVectorStorage,
+    LLMResponseCache,
     NetworkXStorage,
 )
 from ._utils import (
@@ -44,6 +48,7 @@ from .base import (
     BaseVectorStorage,
     StorageNameSpace,
     QueryParam,
+    TextChunkSchema,
 )
 
 
@@ -70,13 +75,24 @@ class GraphRAG:
     chunk_token_size: int = 1200
     chunk_overlap_token_size: int = 100
     tiktoken_model_name: str = "gpt-4o"
+    # >0: insert batches of at least `chunk_process_pool_min_docs` docs are chunked
+    # in that many worker processes. Workers are spawned, so they re-import the
+    # main module; otherwise chunking runs in a thread off the event loop
+    chunk_process_pool_size: int = 0
+    chunk_process_pool_min_docs: int = 64
 
     # entity extraction
     entity_extract_max_gleaning: int = 1
+    # skip gleaning for chunks whose first pass returned fewer records
+    entity_extract_gleaning_min_records: int = 0
     entity_summary_to_max_tokens: int = 500
+    # over-long descriptions summarized together in one cheap-model request
+    entity_summary_batch_size: int = 8
 
     # graph clustering
     graph_cluster_algorithm: str = "leiden"
+    # only extract and merge entities on insert, cluster and report in `abuild_communities`
+    defer_community_reports: bool = False
     max_graph_cluster_size: int = 10
     graph_cluster_seed: int = 0xDEADBEEF
 
@@ -116,16 +132,24 @@ class GraphRAG:
     cheap_model_func: callable = gpt_4o_mini_complete
     cheap_model_max_token_size: int = 32768
     cheap_model_max_async: int = 16
+    # RPM/TPM budget per model name, see `_rate_limit.configure_rate_limits`
+    llm_rate_limits: dict = field(default_factory=dict)
 
     # entity extraction
     entity_extraction_func: callable = extract_entities
+    # chunks whose extractions are merged into the graph (and sent to embedding) together
+    entity_merge_batch_size: int = 64
 
     # storage
     key_string_value_json_storage_cls: Type[BaseKVStorage] = JsonKVStorage
+    key_string_value_json_storage_cls_kwargs: dict = field(default_factory=dict)
     vector_db_storage_cls: Type[BaseVectorStorage] = HNSWVectorStorage
     vector_db_storage_cls_kwargs: dict = field(default_factory=dict)
     graph_storage_cls: Type[BaseGraphStorage] = NetworkXStorage
+    graph_storage_cls_kwargs: dict = field(default_factory=dict)
     enable_llm_cache: bool = True
+    llm_cache_flush_every: int = 32
+    llm_cache_flush_interval: float = 5.0
 
     # extension
     always_create_working_dir: bool = True
@@ -155,6 +179,8 @@ class GraphRAG:
                 "Please use OpenAI or Azure OpenAI instead."
             )
 
+        configure_rate_limits(self.llm_rate_limits)
+
         if not os.path.exists(self.working_dir) and self.always_create_working_dir:
             logger.info(f"Creating working directory {self.working_dir}")
             os.makedirs(self.working_dir)
@@ -168,8 +194,12 @@ class GraphRAG:
         )
 
         self.llm_response_cache = (
-            self.key_string_value_json_storage_cls(
-                namespace="llm_response_cache", global_config=asdict(self)
+            LLMResponseCache(
+                namespace="llm_response_cache",
+                global_config=asdict(self),
+                kv=self.key_string_value_json_storage_cls(
+                    namespace="llm_response_cache", global_config=asdict(self)
+                ),
             )
             if self.enable_llm_cache
             else None
@@ -236,6 +266,10 @@ class GraphRAG:
                 asdict(self),
             )
         elif param.mode == "global":
+            if self.communities_stale:
+                logger.warning(
+                    "Community reports predate the last insert, call abuild_communities to refresh them"
+                )
             response = await global_query(
                 query,
                 self.chunk_entity_relation_graph,
@@ -258,7 +292,17 @@ class GraphRAG:
         await self._query_done()
         return response
 
-    async def ainsert(self, string_or_strings):
+    async def ainsert(
+        self,
+        string_or_strings,
+        progress_callback: Callable[[str, str, float], None] = None,
+    ):
+        """Insert documents, extracting all their chunks in one pass.
+
+        `progress_callback(doc_id, step, fraction)` is called as each new
+        document goes through "entity_extraction" (fraction of its chunks done),
+        "community_report" and "done".
+        """
         await self._insert_start()
         try:
             if isinstance(string_or_strings, str):
@@ -277,12 +321,24 @@ class GraphRAG:
 
             # ---------- chunking
 
-            inserting_chunks = get_chunks(
-                new_docs=new_docs,
+            chunk_kwargs = dict(
                 chunk_func=self.chunk_func,
+                tiktoken_model_name=self.tiktoken_model_name,
                 overlap_token_size=self.chunk_overlap_token_size,
                 max_token_size=self.chunk_token_size,
             )
+            if (
+                self.chunk_process_pool_size > 0
+                and len(new_docs) >= self.chunk_process_pool_min_docs
+            ):
+                inserting_chunks = await get_chunks_in_process_pool(
+                    new_docs, max_workers=self.chunk_process_pool_size, **chunk_kwargs
+                )
+            else:
+                # keep the event loop dispatching LLM calls of other inserts
+                inserting_chunks = await asyncio.to_thread(
+                    get_chunks, new_docs, **chunk_kwargs
+                )
 
             _add_chunk_keys = await self.text_chunks.filter_keys(
                 list(inserting_chunks.keys())
@@ -298,36 +354,98 @@ class GraphRAG:
                 logger.info("Insert chunks for naive RAG")
                 await self.chunks_vdb.upsert(inserting_chunks)
 
-            # TODO: no incremental update for communities now, so just drop all
-            await self.community_reports.drop()
-
             # ---------- extract/summary entity and upsert to graph
             logger.info("[Entity Extraction]...")
+            extraction_kwargs = {}
+            if progress_callback is not None:
+                extraction_kwargs["on_chunk_done"] = self._chunk_progress_reporter(
+                    inserting_chunks, progress_callback
+                )
             maybe_new_kg = await self.entity_extraction_func(
                 inserting_chunks,
                 knwoledge_graph_inst=self.chunk_entity_relation_graph,
                 entity_vdb=self.entities_vdb,
                 global_config=asdict(self),
                 using_amazon_bedrock=self.using_amazon_bedrock,
+                **extraction_kwargs,
             )
             if maybe_new_kg is None:
                 logger.warning("No new entities found")
                 return
             self.chunk_entity_relation_graph = maybe_new_kg
             # ---------- update clusterings of graph
-            logger.info("[Community Report]...")
-            await self.chunk_entity_relation_graph.clustering(
-                self.graph_cluster_algorithm
-            )
-            await generate_community_report(
-                self.community_reports, self.chunk_entity_relation_graph, asdict(self)
-            )
+            if self.defer_community_reports:
+                # reports are outdated until the next `abuild_communities`
+                self.communities_stale = True
+            else:
+                if progress_callback is not None:
+                    for doc_id in new_docs:
+                        progress_callback(doc_id, "community_report", 0.0)
+                await self._build_communities()
 
             # ---------- commit upsertings and indexing
             await self.full_docs.upsert(new_docs)
             await self.text_chunks.upsert(inserting_chunks)
         finally:
             await self._insert_done()
+        if progress_callback is not None:
+            for doc_id in new_docs:
+                progress_callback(doc_id, "done", 1.0)
+
+    @staticmethod
+    def _chunk_progress_reporter(
+        chunks: dict[str, TextChunkSchema],
+        progress_callback: Callable[[str, str, float], None],
+    ) -> Callable[[str, TextChunkSchema], None]:
+        total = Counter(c["full_doc_id"] for c in chunks.values())
+        done = Counter()
+        for doc_id in total:
+            progress_callback(doc_id, "entity_extraction", 0.0)
+
+        def on_chunk_done(chunk_key: str, chunk: TextChunkSchema):
+            doc_id = chunk["full_doc_id"]
+            done[doc_id] += 1
+            progress_callback(doc_id, "entity_extraction", done[doc_id] / total[doc_id])
+
+        return on_chunk_done
+
+    @property
+    def communities_stale(self) -> bool:
+        """Whether the community reports predate an insert, persisted across restarts"""
+        return os.path.exists(self._communities_stale_file_name)
+
+    @communities_stale.setter
+    def communities_stale(self, stale: bool):
+        if stale:
+            with open(self._communities_stale_file_name, "w"):
+                pass
+        elif os.path.exists(self._communities_stale_file_name):
+            os.remove(self._communities_stale_file_name)
+
+    @property
+    def _communities_stale_file_name(self) -> str:
+        return os.path.join(self.working_dir, "community_reports.stale")
+
+    def build_communities(self):
+        loop = always_get_an_event_loop()
+        return loop.run_until_complete(self.abuild_communities())
+
+    async def abuild_communities(self):
+        """Cluster the graph and regenerate the community reports"""
+        await self._insert_start()
+        try:
+            await self._build_communities()
+        finally:
+            await self._insert_done()
+
+    async def _build_communities(self):
+        logger.info("[Community Report]...")
+        # reports of communities that didn't change are reused
+        await self.chunk_entity_relation_graph.clustering(self.graph_cluster_algorithm)
+        await generate_community_report(
+            self.community_reports, self.chunk_entity_relation_graph, asdict(self)
+        )
+        self.communities_stale = False
 
     async def _insert_start(self):
         tasks = []
@@ -354,6 +472,10 @@ class GraphRAG:
                 continue
             tasks.append(cast(StorageNameSpace, storage_inst).index_done_callback())
         await asyncio.gather(*tasks)
+        for name in ["best_model_func", "cheap_model_func", "embedding_func"]:
+            limiter = getattr(getattr(self, name), "limiter", None)
+            if limiter is not None:
+                logger.debug(f"{name} call limiter: {limiter.stats()}")
 
     async def _query_done(self):
         tasks = []
@@ -311,6 +311,35 @@ Output:
 """
 
 
+PROMPTS[
+    "summarize_entity_descriptions_batch"
+] = """You are a helpful assistant responsible for generating comprehensive summaries of the data provided below.
+Each item gives one or two entities, and a list of descriptions, all related to the same entity or group of entities.
+For each item, please concatenate all of its descriptions into a single, comprehensive description. Make sure to include information collected from all the descriptions of the item.
+If the provided descriptions are contradictory, please resolve the contradictions and provide a single, coherent summary.
+Make sure it is written in third person, and include the entity names so we the have full context.
+Return a JSON object with one summary per item, formatted as follows:
+{{
+    "summaries": [
+        {{"id": <item id>, "summary": <summary of the item>}}
+    ]
+}}
+
+#######
+-Data-
+{items}
+#######
+Output:
+"""
+
+PROMPTS[
+    "summarize_entity_descriptions_batch_item"
+] = """Item {id}
+Entities: {entity_name}
+Description List: {description_list}
+"""
+
+
 PROMPTS[
     "entiti_continue_extraction"
 ] = """MANY entities were missed in the last extraction.  Add them below using the same format:
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+import tiktoken
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "core"))
+
+from nano_graphrag import _utils
+
+
+class StubEncoding:
+    """One token per character, so tests run without downloading encodings"""
+
+    def encode(self, content: str) -> list[int]:
+        return [ord(c) for c in content]
+
+    def encode_batch(self, contents: list[str], num_threads: int = 8) -> list[list[int]]:
+        return [self.encode(content) for content in contents]
+
+    def decode(self, tokens: list[int]) -> str:
+        return "".join(map(chr, tokens))
+
+    def decode_batch(self, batch: list[list[int]], num_threads: int = 8) -> list[str]:
+        return [self.decode(tokens) for tokens in batch]
+
+
+@pytest.fixture
+def stub_tokenizer(monkeypatch):
+    monkeypatch.setattr(tiktoken, "encoding_for_model", lambda model_name: StubEncoding())
+    monkeypatch.setattr(_utils, "_tokenizers", {})
+    return _utils.get_tokenizer()
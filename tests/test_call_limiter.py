@@ -0,0 +1,70 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "core"))
+
+from nano_graphrag._utils import AsyncCallLimiter
+
+
+def test_resize_down_under_load_caps_concurrency():
+    async def main():
+        limiter = AsyncCallLimiter(8)
+        running = peak_after_resize = 0
+        resized = asyncio.Event()
+
+        async def call():
+            nonlocal running, peak_after_resize
+            await limiter.acquire()
+            try:
+                running += 1
+                if resized.is_set():
+                    peak_after_resize = max(peak_after_resize, running)
+                await asyncio.sleep(0.01)
+            finally:
+                running -= 1
+                limiter.release()
+
+        tasks = [asyncio.create_task(call()) for _ in range(40)]
+        await asyncio.sleep(0.001)  # 8 running, the rest queued
+        limiter.resize(1)
+        # calls started before the resize may still finish
+        await asyncio.sleep(0.02)
+        resized.set()
+        await asyncio.gather(*tasks)
+        return limiter, peak_after_resize
+
+    limiter, peak = asyncio.run(main())
+    assert peak == 1
+    assert limiter.running == 0
+    assert limiter.stats()["queued"] == 0
+
+
+def test_resize_up_hands_slots_to_waiters():
+    async def main():
+        limiter = AsyncCallLimiter(1)
+        running = peak = 0
+        release = asyncio.Event()
+
+        async def call():
+            nonlocal running, peak
+            await limiter.acquire()
+            try:
+                running += 1
+                peak = max(peak, running)
+                await release.wait()
+            finally:
+                running -= 1
+                limiter.release()
+
+        tasks = [asyncio.create_task(call()) for _ in range(6)]
+        await asyncio.sleep(0.001)
+        limiter.resize(4)
+        await asyncio.sleep(0.001)
+        release.set()
+        await asyncio.gather(*tasks)
+        return limiter, peak
+
+    limiter, peak = asyncio.run(main())
+    assert peak == 4
+    assert limiter.running == 0
@@ -0,0 +1,76 @@
+import asyncio
+import re
+
+from nano_graphrag._op import extract_entities
+from nano_graphrag._storage import NetworkXStorage
+from nano_graphrag._utils import compute_mdhash_id, convert_response_to_json
+from nano_graphrag.prompt import PROMPTS
+
+TUPLE = PROMPTS["DEFAULT_TUPLE_DELIMITER"]
+RECORD = PROMPTS["DEFAULT_RECORD_DELIMITER"]
+COMPLETION = PROMPTS["DEFAULT_COMPLETION_DELIMITER"]
+
+
+class CountingVectorStorage:
+    def __init__(self):
+        self.upserts = []
+
+    async def upsert(self, data: dict[str, dict]):
+        self.upserts.append(data)
+
+
+def test_entity_across_merge_batches_is_summarized_and_embedded_at_most_twice(
+    tmp_path, stub_tokenizer
+):
+    summary_prompts = []
+
+    async def best_model_func(prompt, **kwargs):
+        chunk_id = re.search(r"chunk number (\d+)", prompt).group(1)
+        return (
+            f'("entity"{TUPLE}"ALPHA"{TUPLE}"METHOD"{TUPLE}"Alpha as used in chunk {chunk_id}.")'
+            f"{RECORD}"
+            f'("entity"{TUPLE}"BETA {chunk_id}"{TUPLE}"METHOD"{TUPLE}"Beta.")'
+            f"{COMPLETION}"
+        )
+
+    async def cheap_model_func(prompt, **kwargs):
+        summary_prompts.append(prompt)
+        return "Alpha, summarized."
+
+    global_config = dict(
+        working_dir=str(tmp_path),
+        best_model_func=best_model_func,
+        best_model_max_async=4,
+        cheap_model_func=cheap_model_func,
+        cheap_model_max_token_size=4096,
+        entity_extract_max_gleaning=0,
+        entity_extract_gleaning_min_records=0,
+        entity_merge_batch_size=2,
+        entity_summary_to_max_tokens=40,
+        entity_summary_batch_size=8,
+        tiktoken_model_name="gpt-4o",
+        convert_response_to_json_func=convert_response_to_json,
+    )
+    chunks = {
+        f"chunk-{i}": dict(
+            content=f"Text of chunk number {i}.",
+            tokens=8,
+            chunk_order_index=i,
+            full_doc_id="doc-0",
+        )
+        for i in range(8)
+    }
+    graph = NetworkXStorage(namespace="graph", global_config=global_config)
+    entity_vdb = CountingVectorStorage()
+
+    asyncio.run(extract_entities(chunks, graph, entity_vdb, global_config))
+
+    # ALPHA is in all four merge batches
+    assert len([p for p in summary_prompts if '"ALPHA"' in p]) == 2
+    alpha_id = compute_mdhash_id('"ALPHA"', prefix="ent-")
+    assert 1 <= len([data for data in entity_vdb.upserts if alpha_id in data]) <= 2
+    alpha = asyncio.run(graph.get_node('"ALPHA"'))
+    assert alpha["description"] == "Alpha, summarized."
+    assert set(alpha["source_id"].split("<SEP>")) == set(chunks)
+    for i in range(8):
+        assert asyncio.run(graph.has_node(f'"BETA {i}"'))
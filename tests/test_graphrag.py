@@ -0,0 +1,10 @@
+from nano_graphrag import GraphRAG
+
+
+def test_communities_stale_survives_a_restart(tmp_path, stub_tokenizer):
+    rag = GraphRAG(working_dir=str(tmp_path), defer_community_reports=True)
+    assert not rag.communities_stale
+    rag.communities_stale = True
+    assert GraphRAG(working_dir=str(tmp_path)).communities_stale
+    rag.communities_stale = False
+    assert not GraphRAG(working_dir=str(tmp_path)).communities_stale
@@ -0,0 +1,43 @@
+import random
+
+import pytest
+
+from nano_graphrag._op import chunking_by_paper_structure
+
+WORDS = (
+    "graph neural network model attention transformer protein dataset training "
+    "loss gradient embedding retrieval benchmark accuracy baseline we propose"
+).split()
+
+
+def make_paper(rng: random.Random) -> str:
+    def paragraph(num_sentences: int) -> str:
+        return " ".join(
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 20))).capitalize()
+            + "."
+            for _ in range(num_sentences)
+        )
+
+    parts = ["Abstract", paragraph(5)]
+    for s in range(6):
+        parts.append(f"{s + 1} A Rather Long Section Heading Number {s + 1}")
+        # the first paragraph of some sections is longer than any chunk
+        parts.extend(paragraph(rng.choice([2, 8, 40])) for _ in range(rng.randint(1, 4)))
+    return "\n\n".join(parts)
+
+
+@pytest.mark.parametrize("max_token_size", [300, 600, 1200])
+def test_no_chunk_exceeds_max_token_size(stub_tokenizer, max_token_size):
+    encoding = stub_tokenizer.encoding
+    rng = random.Random(max_token_size)
+    papers = [make_paper(rng) for _ in range(5)]
+    chunks = chunking_by_paper_structure(
+        [encoding.encode(paper) for paper in papers],
+        doc_keys=[f"doc-{i}" for i in range(len(papers))],
+        tiktoken_model=encoding,
+        overlap_token_size=50,
+        max_token_size=max_token_size,
+    )
+    assert any(c["content"].startswith("1 A Rather Long") for c in chunks)
+    for chunk in chunks:
+        assert chunk["tokens"] <= max_token_size, chunk["content"][:80]
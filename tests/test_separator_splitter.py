@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+from nano_graphrag._splitter import SeparatorSplitter
+from nano_graphrag.prompt import PROMPTS
+
+
+def split_by_scanning(splitter: SeparatorSplitter, tokens: list[int]) -> list[list[int]]:
+    """Separator splitting as done before the trie, trying every separator at
+    every position"""
+    splits = []
+    current_split = []
+    i = 0
+    while i < len(tokens):
+        separator_found = False
+        for separator in splitter._separators:
+            if tokens[i : i + len(separator)] == separator:
+                if splitter._keep_separator in [True, "end"]:
+                    current_split.extend(separator)
+                if current_split:
+                    splits.append(current_split)
+                    current_split = []
+                if splitter._keep_separator == "start":
+                    current_split.extend(separator)
+                i += len(separator)
+                separator_found = True
+                break
+        if not separator_found:
+            current_split.append(tokens[i])
+            i += 1
+    if current_split:
+        splits.append(current_split)
+    return [s for s in splits if s]
+
+
+@pytest.mark.parametrize("keep_separator", [True, False, "start", "end"])
+def test_trie_split_matches_scanning_split(keep_separator):
+    rng = random.Random(0)
+    for _ in range(500):
+        # a tiny alphabet makes separators overlap, nest and share prefixes
+        separators = [
+            [rng.randrange(6) for _ in range(rng.randint(1, 3))]
+            for _ in range(rng.randint(1, 6))
+        ]
+        tokens = [rng.randrange(6) for _ in range(rng.randint(0, 200))]
+        splitter = SeparatorSplitter(separators, keep_separator=keep_separator)
+        assert splitter._split_tokens_with_separators(tokens) == split_by_scanning(
+            splitter, tokens
+        ), (separators, tokens)
+
+
+def test_trie_split_matches_scanning_split_on_text(stub_tokenizer):
+    separators = [stub_tokenizer.encode(s) for s in PROMPTS["default_text_separator"]]
+    splitter = SeparatorSplitter(separators=separators, chunk_size=200, chunk_overlap=20)
+    text = (
+        "1 Introduction\n\nWe propose a method. It works?! See Table 1;"
+        " results follow:\n- item one\n- item two\r\n\tL(θ) = −∑ log p(y | x; θ)"
+        "    (1)\n\n\nReferences\n[1] A. Author. A cited work. Venue, 2020."
+    ) * 5
+    tokens = stub_tokenizer.encode(text)
+    splits = splitter._split_tokens_with_separators(tokens)
+    assert splits == split_by_scanning(splitter, tokens)
+    assert sum(map(len, splits)) == len(tokens)
@@ -0,0 +1,23 @@
+from nano_graphrag._utils import get_tokenizer, truncate_list_by_token_size
+
+
+def test_uncached_counts_leave_the_cache_alone(stub_tokenizer):
+    assert stub_tokenizer.count_batch(["ab", "abc"]) == [2, 3]
+    assert stub_tokenizer.count_batch(["prompt", "completion"], cache=False) == [6, 10]
+    assert stub_tokenizer.count("x" * 5000, cache=False) == 5000
+    assert list(stub_tokenizer._counts) == ["ab", "abc"]
+    assert stub_tokenizer.count("abc") == 3
+    assert (stub_tokenizer.hits, stub_tokenizer.misses) == (1, 2)
+
+
+def test_truncate_counts_with_the_given_tokenizer(stub_tokenizer):
+    tokenizer = get_tokenizer("text-davinci-003")
+    items = [{"text": "a" * 4, "tokens": None}, {"text": "b" * 4, "tokens": 3}, {"text": "c"}]
+    assert truncate_list_by_token_size(
+        items,
+        key=lambda x: x["text"],
+        max_token_size=7,
+        count_key=lambda x: x.get("tokens"),
+        tokenizer=tokenizer,
+    ) == items[:2]
+    assert tokenizer.misses == 2 and stub_tokenizer.misses == 0